@@ -0,0 +1,203 @@
+import copy
+import heapq
+import math
+from datetime import date, datetime
+
+
+# Итоги по транзакциям пользователя, которые хранилище поддерживает при каждой записи:
+# имя -> (пустое значение, учет одной транзакции со знаком +1/-1)
+AGGREGATES = {}
+
+
+def _amount(transaction):
+    amount = transaction.get("amount", 0)
+    return amount if isinstance(amount, (int, float)) else 0
+
+
+def _empty_totals():
+    return {
+        # По полю type (как на главной)
+        "income": 0.0,
+        "expense": 0.0,
+        "balance": 0.0,
+        "count": {"income": 0, "expense": 0, "other": 0},
+        # По знаку суммы (как в отчетах)
+        "positive": 0.0,
+        "negative": 0.0,
+    }
+
+
+def _add_totals(totals, transaction, sign):
+    amount = _amount(transaction)
+    trans_type = transaction.get("type")
+    if trans_type == "income":
+        totals["income"] += sign * amount
+    elif trans_type == "expense":
+        totals["expense"] += sign * abs(amount)
+    else:
+        trans_type = "other"
+    totals["count"][trans_type] += sign
+    if amount > 0:
+        totals["positive"] += sign * amount
+    elif amount < 0:
+        totals["negative"] -= sign * amount
+    totals["balance"] = totals["income"] - totals["expense"]
+
+
+AGGREGATES["totals"] = (_empty_totals, _add_totals)
+
+
+def month_key(value):
+    """Дата 'ГГГГ-ММ-ДД' -> месяц 'ГГГГ-ММ' (None, если даты нет или она некорректна)"""
+    if not value or not isinstance(value, str):
+        return None
+    if len(value) == 10 and value[4] == "-" and value[7] == "-":
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            return None
+        return value[:7]
+    try:
+        # strptime принимает и даты без ведущих нулей (2024-1-5)
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m')
+    except ValueError:
+        return None
+
+
+def _add_monthly(months, transaction, sign):
+    """Месяц -> [доходы, расходы, баланс, количество] (доход — сумма > 0, как в отчетах)"""
+    key = month_key(transaction.get("date"))
+    if key is None:
+        return
+    row = months.get(key)
+    if row is None:
+        row = months[key] = [0.0, 0.0, 0.0, 0]
+    amount = _amount(transaction)
+    if amount > 0:
+        row[0] += sign * amount
+    else:
+        row[1] -= sign * amount
+    row[2] += sign * amount
+    row[3] += sign
+    if row[3] <= 0:
+        # Последняя транзакция месяца удалена
+        del months[key]
+
+
+AGGREGATES["monthly"] = (dict, _add_monthly)
+
+
+def category_type(transaction):
+    """Раздел свода категорий: расход — сумма < 0, иначе доход (как в отчетах)"""
+    return "expense" if _amount(transaction) < 0 else "income"
+
+
+def _empty_by_category():
+    return {"income": {}, "expense": {}}
+
+
+def _add_by_category(rollup, transaction, sign):
+    """Тип -> категория -> [сумма по модулю, количество]"""
+    by_category = rollup[category_type(transaction)]
+    name = transaction.get("category", "Другое")
+    row = by_category.get(name)
+    if row is None:
+        row = by_category[name] = [0.0, 0]
+    row[0] += sign * abs(_amount(transaction))
+    row[1] += sign
+    if row[1] <= 0:
+        del by_category[name]
+
+
+AGGREGATES["by_category"] = (_empty_by_category, _add_by_category)
+
+
+def top_categories(by_category, limit=None):
+    """Категории свода по убыванию суммы; limit — первые N (через кучу, без полной сортировки)"""
+    if limit is None:
+        return sorted(by_category.items(), key=lambda item: item[1][0], reverse=True)
+    return heapq.nlargest(limit, by_category.items(), key=lambda item: item[1][0])
+
+
+def month_window(monthly, start=None, end=None, limit=None):
+    """Месяцы свода monthly в окне [start, end] ('ГГГГ-ММ'), новые первыми; limit — последние N"""
+    keys = [key for key in monthly if (start is None or key >= start) and (end is None or key <= end)]
+    if limit is not None:
+        return heapq.nlargest(limit, keys)
+    return sorted(keys, reverse=True)
+
+
+def compute_aggregates(transactions):
+    """Полный пересчет итогов по списку транзакций (импорт, восстановление)"""
+    result = {name: empty() for name, (empty, _) in AGGREGATES.items()}
+    for transaction in transactions:
+        if isinstance(transaction, dict):
+            for name, (_, add) in AGGREGATES.items():
+                add(result[name], transaction, 1)
+    return result
+
+
+def _records_by_id(records, ids):
+    return [record for record in records if isinstance(record, dict) and record.get("id") in ids]
+
+
+def update_aggregates(stored, user_data, change, load_records=None):
+    """Итоги после изменения транзакций (change — как в описании изменений)
+
+    stored — сохраненные данные пользователя (итоги и, если нет load_records, транзакции);
+    load_records(ids) — сохраненные транзакции с этими ID (None — все).
+    Добавление стоит O(добавленных записей); изменение и удаление вычитают старые записи.
+    """
+    if load_records is None:
+        transactions = stored.get("transactions", [])
+        load_records = lambda ids: transactions if ids is None else _records_by_id(transactions, ids)
+
+    if change is None:
+        return compute_aggregates(user_data.get("transactions", []))
+
+    result = {}
+    missing = [name for name in AGGREGATES if not isinstance(stored.get(name), dict)]
+    if missing:
+        # Данные без итогов: один раз считаем по сохраненным транзакциям
+        result = compute_aggregates(load_records(None))
+    for name in AGGREGATES:
+        if name not in missing:
+            result[name] = copy.deepcopy(stored[name])
+
+    def add(record, sign):
+        for name, (_, add_record) in AGGREGATES.items():
+            add_record(result[name], record, sign)
+
+    removed = set(change.get("removed", []))
+    latest = {record.get("id"): record for record in change.get("updated", []) if isinstance(record, dict)}
+    old = {}
+    if latest or removed:
+        old = {record.get("id"): record for record in load_records(set(latest) | removed)}
+    for record in old.values():
+        add(record, -1)
+
+    for record in change.get("added", []):
+        if not isinstance(record, dict) or record.get("id") in removed:
+            continue
+        # Запись, измененная в той же пачке, учитывается один раз — в последнем виде
+        add(latest.pop(record.get("id"), record), 1)
+    for record_id, record in latest.items():
+        if record_id in old and record_id not in removed:
+            add(record, 1)
+    return result
+
+
+def _close(expected, actual):
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and expected.keys() == actual.keys() and all(
+            _close(value, actual[key]) for key, value in expected.items()
+        )
+    if isinstance(expected, float) or isinstance(actual, float):
+        return isinstance(actual, (int, float)) and math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-6)
+    return expected == actual
+
+
+def check_aggregates(user_data):
+    """Сверка сохраненных итогов с транзакциями: имена расходящихся итогов"""
+    expected = compute_aggregates(user_data.get("transactions", []))
+    return [name for name in AGGREGATES if not _close(expected[name], user_data.get(name))]
@@ -1,17 +1,47 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file, session
-import json
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session
 from datetime import datetime
 import csv
-import io
 import hashlib
 import os
+import click
 from modules.decorators import *
 from modules.utils import *
+from modules.aggregates import compute_aggregates, month_key
+from modules.columnar import PIVOT_DIMENSIONS, transaction_columns
+from modules.dates import normalize_date, parse_day
+from modules.indexes import SEARCH_FIELDS, format_cursor, parse_cursor, search_index, transaction_index
+from modules.export import CSV_SECTIONS, JSON_FORMATS, encode_chunks, iter_csv, iter_json, stream_download
+from modules.importer import MAX_REPORTED_ERRORS, iter_batches, iter_csv_rows, iter_ndjson_rows, open_text
+from modules.reports import build_report, category_summary, monthly_summary
+from modules.data_context import get_data_context, init_data_context
+from modules.storage import allocate_id, create_default_data, create_store
 
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 DATA_FILE = "finance_data.json"
+SQLITE_FILE = os.environ.get('FINANCE_SQLITE_FILE', 'finance_data.db')
+# Транзакций на странице /transactions и /api/transactions (по умолчанию и не больше)
+TRANSACTIONS_PAGE_SIZE = 50
+TRANSACTIONS_PAGE_MAX = 500
+# Результатов поиска /api/search (по умолчанию и не больше)
+SEARCH_LIMIT = 20
+SEARCH_LIMIT_MAX = 100
+DATA_DIR = os.environ.get('FINANCE_DATA_DIR', 'data')
+# Бэкенд хранения: json (по умолчанию), sqlite, sharded (файл на пользователя)
+# или journal (файл на пользователя + журнал дозаписи)
+STORAGE_BACKEND = os.environ.get('FINANCE_STORAGE', 'json')
+# fsync после каждой записи в журнал
+JOURNAL_FSYNC = os.environ.get('FINANCE_JOURNAL_FSYNC', '0') == '1'
+# Формат файлов данных: json (компактный), json-pretty, marshal, orjson/msgpack (если
+# установлены), с суффиксом +zlib — со сжатием. При чтении формат определяется сам
+DATA_CODEC = os.environ.get('FINANCE_CODEC', 'json')
+# Окно отложенной записи в миллисекундах: сохранения за окно пишутся на диск одной записью
+# (0 — писать сразу). Ответ после записи на диск — с заголовком запроса X-Durable-Write: 1
+WRITE_BEHIND_MS = float(os.environ.get('FINANCE_WRITE_BEHIND_MS', '0'))
+store = create_store(STORAGE_BACKEND, data_file=DATA_FILE, sqlite_file=SQLITE_FILE, data_dir=DATA_DIR,
+                     fsync=JOURNAL_FSYNC, codec=DATA_CODEC, write_behind=WRITE_BEHIND_MS / 1000)
+init_data_context(app)
 
 
 @app.template_filter('filesizeformat')
@@ -70,104 +100,24 @@ def inject_utils():
         'now': datetime.now()
     }
 def load_data():
-    """Загрузка данных из файла"""
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:  # Файл пустой
-                    print("⚠️ Файл данных пустой, создаем новую структуру")
-                    return create_default_data()
-
-                data = json.loads(content)
-
-                # Проверяем структуру данных
-                if not isinstance(data, dict):
-                    print("⚠️ Данные в неправильном формате, создаем новую структуру")
-                    return create_default_data()
-
-                # Проверяем наличие ключей
-                if "users" not in data:
-                    print("⚠️ В данных нет ключа 'users', восстанавливаем структуру")
-                    default_data = create_default_data()
-                    # Сохраняем существующие данные, но добавляем структуру users
-                    if isinstance(data, dict):
-                        data["users"] = default_data.get("users", [])
-                        if "categories" not in data:
-                            data["categories"] = default_data.get("categories", {})
-                        if "investment_types" not in data:
-                            data["investment_types"] = default_data.get("investment_types", [])
-                        if "risk_profiles" not in data:
-                            data["risk_profiles"] = default_data.get("risk_profiles", [])
-                    return data
-
-                return data
-
-        except json.JSONDecodeError as e:
-            print(f" Ошибка чтения JSON файла: {e}, создаем новую структуру")
-            return create_default_data()
-        except Exception as e:
-            print(f"Неизвестная ошибка при загрузке данных: {e}, создаем новую структуру")
-            return create_default_data()
-    else:
-        print(" Файл данных не существует, создаем новую структуру")
-        return create_default_data()
-
-
-def create_default_data():
-    """Создание структуры данных по умолчанию с пользователями"""
-    return {
-        "users": [
-            {
-                "id": 1,
-                "username": "demo",
-                # Пароль "demo123" в хешированном виде
-                "password_hash": "6ca13d52ca70c883e0f0bb101e425a89e8624de51db2d2392593af6a84118090",
-                "email": "demo@example.com",
-                "created_at": "2024-01-01",
-                "risk_profile": 2,  # умеренный профиль риска
-                "transactions": [],  # Личные транзакции пользователя
-                "investments": [],   # Личные инвестиции
-                "goals": []          # Личные цели
-            }
-        ],
-        # ОБЩИЕ ДАННЫЕ:
-        "categories": {
-            "income": ["Зарплата", "Подработка", "Дивиденды", "Подарок", "Другое"],
-            "expense": ["Еда", "Транспорт", "Аренда", "Развлечения", "Коммуналка", "Другое"]
-        },
-        "investment_types": ["Акции", "Облигации", "Депозиты", "Недвижимость", "ETF", "Криптовалюта"],
-        "risk_profiles": [
-            {"id": 1, "name": "Консервативный", "description": "Минимальный риск, стабильный доход", "stocks_ratio": 20, "bonds_ratio": 60, "cash_ratio": 20},
-            {"id": 2, "name": "Умеренный", "description": "Баланс риска и доходности", "stocks_ratio": 50, "bonds_ratio": 40, "cash_ratio": 10},
-            {"id": 3, "name": "Агрессивный", "description": "Высокий риск, потенциально высокая доходность", "stocks_ratio": 80, "bonds_ratio": 15, "cash_ratio": 5}
-        ]
-    }
+    """Загрузка всех данных (в рамках запроса — один раз)"""
+    context = get_data_context(store)
+    if context is None:
+        return store.load_data()
+    return context.load_data()
 
 
 def save_data(data):
-    """Сохранение данных в файл"""
+    """Сохранение всех данных (в рамках запроса — в конце запроса)"""
     # Гарантируем правильную структуру данных
     if not isinstance(data, dict):
         print(" Ошибка")
         return False
 
-    # Гарантируем наличие обязательных ключей
-    required_keys = ["users", "categories", "investment_types", "risk_profiles"]
-    for key in required_keys:
-        if key not in data:
-            print(f"В данных отсутствует ключ '{key}', создаем...")
-            default_data = create_default_data()
-            data[key] = default_data.get(key)
-
-    try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f" Данные сохранены в {DATA_FILE}")
-        return True
-    except Exception as e:
-        print(f" Ошибка при сохранении данных: {e}")
-        return False
+    context = get_data_context(store)
+    if context is None:
+        return store.save_data(data)
+    return context.save_data(data)
 
 
 def generate_menu_components(current_user, current_title):
@@ -242,21 +192,22 @@ def generate_menu_components(current_user, current_title):
 
     return menu_links, user_info, mobile_menu
 # с пользоватеями
+def get_user(user_id):
+    """Пользователь по ID (в рамках запроса — из контекста)"""
+    context = get_data_context(store)
+    if context is None:
+        return store.get_user(user_id)
+    return context.get_user(user_id)
+
+
 def get_current_user():
     """Получение текущего пользователя из сессии"""
-    data = load_data()
-
     # Получаем ID пользователя из сессии
     user_id = session.get('user_id')
     if not user_id:
         return None
 
-    # Ищем пользователя в данных
-    for user in data.get("users", []):
-        if user.get("id") == user_id:
-            return user
-
-    return None
+    return get_user(user_id)
 
 
 def hash_password(password):
@@ -266,33 +217,16 @@ def hash_password(password):
 
 def authenticate_user(username, password):
     """Проверка логина и пароля"""
-    data = load_data()
-    password_hash = hash_password(password)
-
-    for user in data.get("users", []):
-        if user.get("username") == username and user.get("password_hash") == password_hash:
-            return user
+    user = store.find_user(username)
+    if user and user.get("password_hash") == hash_password(password):
+        return user
 
     return None
 
 
 def create_user(username, password, email=""):
     """Создание нового пользователя"""
-    data = load_data()
-
-    # Гарантируем, что ключ "users" существует
-    if "users" not in data:
-        data["users"] = []
-        print("⚠️ Ключ 'users' не найден в данных, создаем пустой список")
-
-    # Проверяем, не занято ли имя пользователя
-    for user in data.get("users", []):
-        if user.get("username") == username:
-            return None  # Пользователь уже существует
-
-    # Создаём нового пользователя
-    new_user = {
-        "id": len(data.get("users", [])) + 1,
+    new_user = store.create_user({
         "username": username,
         "password_hash": hash_password(password),  # Храним только хеш!
         "email": email,
@@ -300,11 +234,11 @@ def create_user(username, password, email=""):
         "risk_profile": 2,
         "transactions": [],  # Пустые списки для личных данных
         "investments": [],
-        "goals": []
-    }
-
-    data["users"].append(new_user)
-    save_data(data)
+        "goals": [],
+        **compute_aggregates([])  # Итоги по пустому списку — чтобы не пересчитывать при загрузке
+    })
+    if new_user is None:
+        return None  # Пользователь уже существует
 
     print(f" Создан новый пользователь: {username} (ID: {new_user['id']})")
     return new_user
@@ -312,58 +246,59 @@ def create_user(username, password, email=""):
 
 def load_user_data(user_id):
     """Загрузка данных конкретного пользователя"""
-    data = load_data()
-
-    # Ищем пользователя
-    for user in data.get("users", []):
-        if user.get("id") == user_id:
-            # Возвращаем данные пользователя + общие настройки
-            return {
-                # Личные данные пользователя:
-                "transactions": user.get("transactions", []),
-                "investments": user.get("investments", []),
-                "goals": user.get("goals", []),
-                # Общие данные (для всех одинаковые):
-                "categories": data.get("categories", {}),
-                "investment_types": data.get("investment_types", []),
-                "risk_profiles": data.get("risk_profiles", []),
-                # Информация о пользователе:
-                "user_info": {
-                    "id": user.get("id"),
-                    "username": user.get("username"),
-                    "email": user.get("email"),
-                    "risk_profile": user.get("risk_profile", 2)
-                }
-            }
+    context = get_data_context(store)
+    if context is None:
+        return store.load_user_data(user_id)
+    return context.load_user_data(user_id)
 
-    return None
 
+def save_user_data(user_id, user_data, changes=None):
+    """Сохранение данных пользователя
+
+    В рамках запроса запись откладывается до его конца, и пишутся только
+    изменившиеся коллекции (данные из load_user_data отслеживают изменения).
+    """
+    context = get_data_context(store)
+    if context is None:
+        return store.save_user_data(user_id, user_data, changes)
+    return context.save_user_data(user_id, user_data, changes)
 
-def save_user_data(user_id, user_data):
 
-    all_data = load_data()
-    # Находим нужного пользователя
-    for i, user in enumerate(all_data.get("users", [])):
-        if user.get("id") == user_id:
+def add_user_record(user_id, user_data, collection, record):
+    """Добавление записи в коллекцию пользователя (без перезаписи остальных)"""
+    user_data.setdefault(collection, []).append(record)
+    return save_user_data(user_id, user_data, {collection: {"added": [record]}, "counters": None})
 
-            if "transactions" in user_data:
-                all_data["users"][i]["transactions"] = user_data["transactions"]
 
-            if "investments" in user_data:
-                all_data["users"][i]["investments"] = user_data["investments"]
+def add_user_records(user_id, user_data, collection, records):
+    """Добавление пачки записей в коллекцию пользователя одной записью в хранилище"""
+    user_data.setdefault(collection, []).extend(records)
+    return save_user_data(user_id, user_data, {collection: {"added": list(records)}, "counters": None})
 
-            if "goals" in user_data:
-                all_data["users"][i]["goals"] = user_data["goals"]
 
-            # Если есть информация о пользователе
-            if "user_info" in user_data:
-                all_data["users"][i]["risk_profile"] = user_data["user_info"].get("risk_profile", 2)
+def get_user_record(user_data, collection, record_id):
+    """Запись коллекции пользователя по id (None, если не найдена)"""
+    records = user_data.get(collection, [])
+    if hasattr(records, "get_record"):
+        return records.get_record(record_id)
+    for record in records:
+        if isinstance(record, dict) and record.get("id") == record_id:
+            return record
+    return None
 
-            # Сохраняем ВСЕ данные обратно в файл
-            save_data(all_data)
-            return True
 
-    return False
+def delete_user_record(user_id, user_data, collection, record_id):
+    """Удаление записи коллекции пользователя по id (False, если не найдена)"""
+    records = user_data.get(collection, [])
+    if hasattr(records, "delete_record"):
+        if records.delete_record(record_id) is None:
+            return False
+    else:
+        record = get_user_record(user_data, collection, record_id)
+        if record is None:
+            return False
+        records.remove(record)
+    return save_user_data(user_id, user_data, {collection: {"removed": [record_id]}})
 
 # АВТОРИЗАЦИЯ
 @app.route('/login', methods=['GET', 'POST'])
@@ -459,12 +394,11 @@ def logout():
 def index(user_data, current_user):
     # Получаем данные
     transactions = user_data.get("transactions", [])
-    incomes = [t for t in transactions if isinstance(t, dict) and t.get("type") == "income"]
-    expenses = [t for t in transactions if isinstance(t, dict) and t.get("type") == "expense"]
-
-    total_income = sum(t.get("amount", 0) for t in incomes if isinstance(t.get("amount"), (int, float)))
-    total_expense = sum(abs(t.get("amount", 0)) for t in expenses if isinstance(t.get("amount"), (int, float)))
-    balance = total_income - total_expense
+    # Итоги ведет хранилище при каждой записи — историю не перебираем
+    totals = user_data["totals"]
+    total_income = totals["income"]
+    total_expense = totals["expense"]
+    balance = totals["balance"]
 
     # Последние транзакции
     recent_transactions = transactions[-5:] if len(transactions) > 5 else transactions
@@ -536,21 +470,20 @@ def api_add_transaction(user_data, current_user):
         if trans_type == "expense":
             amount = -abs(amount)
 
+        # Дата проверяется и приводится к ISO при записи; рядом — номер дня для аналитики
+        trans_date = normalize_date(request.form.get("date") or datetime.now().strftime("%Y-%m-%d"))
+
         transaction = {
-            "id": len(user_data.get("transactions", [])) + 1,
-            "date": request.form.get("date", datetime.now().strftime("%Y-%m-%d")),
+            "id": allocate_id(user_data, "transactions"),
+            "date": trans_date,
+            "day": parse_day(trans_date),
             "type": trans_type,
             "amount": amount,
             "description": request.form.get("description", ""),
             "category": request.form.get("category", "Другое")
         }
 
-        # Инициализируем список транзакций, если его нет
-        if "transactions" not in user_data:
-            user_data["transactions"] = []
-
-        user_data["transactions"].append(transaction)
-        save_user_data(current_user['id'], user_data)
+        add_user_record(current_user['id'], user_data, "transactions", transaction)
 
         return redirect("/transactions")
 
@@ -563,28 +496,104 @@ def api_add_transaction(user_data, current_user):
 @login_required
 @load_user_data_decorator
 def transactions_page(user_data, current_user):
-    transactions = user_data.get("transactions", [])
-
-    # Сортируем транзакции по дате (новые сверху)
+    # Страница по индексу (новые сверху); некорректные параметры — первая страница без фильтров
+    args = request.args.to_dict()
     try:
-        transactions_sorted = sorted(
-            [t for t in transactions if isinstance(t, dict) and t.get('date')],
-            key=lambda x: x.get('date', ''),
-            reverse=True
-        )
-    except:
-        transactions_sorted = transactions
+        page, next_cursor, limit = get_transactions_page(user_data, args)
+    except ValueError:
+        args = {}
+        page, next_cursor, limit = get_transactions_page(user_data, args)
+    counts = user_data["totals"]["count"]
+    # Ссылки на страницы сохраняют фильтры запроса
+    args.pop('before', None)
 
     return render_template(
         'transactions.html',
         current_user=current_user,
         current_title="Транзакции",
-        transactions=transactions,
-        transactions_sorted=transactions_sorted,
+        transactions_count=len(transaction_index(user_data)),
+        income_count=counts["income"],
+        expense_count=counts["expense"],
+        transactions_page=page,
+        next_url=url_for('transactions_page', **args, before=next_cursor) if next_cursor else None,
+        first_url=url_for('transactions_page', **args) if request.args.get('before') else None,
         get_transactions_table = get_transactions_table,
         format_currency=format_currency,
         format_date=format_date
     )
+
+
+def get_transactions_page(user_data, args):
+    """Страница транзакций по параметрам запроса: (записи, курсор дальше, limit)
+
+    before=ГГГГ-ММ-ДД,ID — курсор, limit — размер страницы; фильтры: from/to (даты),
+    category, type, min/max (сумма по модулю). ValueError — некорректный параметр.
+    """
+    before = parse_cursor(args['before']) if args.get('before') else None
+    limit = min(max(int(args.get('limit') or TRANSACTIONS_PAGE_SIZE), 1), TRANSACTIONS_PAGE_MAX)
+    period = []
+    for name in ('from', 'to'):
+        day = parse_day(args[name]) if args.get(name) else None
+        if day == 0:
+            raise ValueError(f"Некорректная дата: {args[name]}")
+        period.append(day)
+    amounts = [float(args[name]) if args.get(name) else None for name in ('min', 'max')]
+
+    page, next_key = transaction_index(user_data).page(
+        before, limit, *period,
+        category=args.get('category') or None,
+        trans_type=args.get('type') or None,
+        min_amount=amounts[0],
+        max_amount=amounts[1]
+    )
+    return page, format_cursor(next_key), limit
+
+
+@app.route('/api/transactions')
+@login_required
+@load_user_data_decorator
+def api_transactions(user_data, current_user):
+    """Транзакции постранично, новые первыми
+
+    ?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД&category=...&type=income|expense&min=...&max=...
+    &before=ГГГГ-ММ-ДД,ID&limit=N
+    """
+    try:
+        page, next_cursor, limit = get_transactions_page(user_data, request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "transactions": page, "next_before": next_cursor, "limit": limit})
+
+
+@app.route('/api/search')
+@login_required
+@load_user_data_decorator
+def api_search(user_data, current_user):
+    """Поиск по описаниям транзакций, инвестициям и целям: ?q=...&limit=N&in=transactions,goals
+
+    Каждое слово запроса ищется как начало слова (для поиска по мере ввода).
+    """
+    query = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit') or SEARCH_LIMIT), 1), SEARCH_LIMIT_MAX)
+    except ValueError:
+        return jsonify({"success": False, "error": "Некорректное число результатов"}), 400
+    collections = None
+    if request.args.get('in'):
+        collections = set(request.args['in'].split(','))
+        if not collections <= set(SEARCH_FIELDS):
+            return jsonify({"success": False, "error": f"Неизвестная коллекция: {request.args['in']}"}), 400
+
+    results = search_index(user_data).search(query, limit, collections)
+    return jsonify({
+        "success": True,
+        "query": query,
+        "results": [
+            {"collection": collection, "score": score, "record": record}
+            for score, collection, record in results
+        ]
+    })
+
 #ЭКСПОРТ
 @app.route('/export')
 @login_required
@@ -600,12 +609,12 @@ def export_page(user_data, current_user):
     investments_count = len(investments)
     goals_count = len(goals)
 
-    # Примерный размер данных (очень грубая оценка)
-    total_size = (
-                         len(json.dumps(transactions)) +
-                         len(json.dumps(investments)) +
-                         len(json.dumps(goals))
-                 ) / 1024  # в КБ
+    # Примерный размер данных (компактный JSON считается потоком, без сборки строки)
+    total_size = sum(
+        len(chunk)
+        for name in ("transactions", "investments", "goals")
+        for chunk in iter_json({name: user_data.get(name, [])}, "compact")
+    ) / 1024  # в КБ
 
     return render_template(
         'export.html',
@@ -618,63 +627,94 @@ def export_page(user_data, current_user):
         total_size=total_size
     )
 
+
+# ИМПОРТ
+@app.route('/api/import/transactions', methods=['POST'])
+@login_required
+@load_user_data_decorator
+def api_import_transactions(user_data, current_user):
+    """Импорт транзакций из CSV (как в экспорте) или NDJSON: файл в поле file или тело запроса
+
+    ?format=csv|ndjson (по умолчанию — по имени и типу файла). Строки проверяются пачками,
+    корректные добавляются и сохраняются одной записью; по остальным — список ошибок.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload is not None else request.stream
+    name = upload.filename if upload is not None else ''
+    mimetype = upload.mimetype if upload is not None else request.mimetype
+    mode = request.args.get('format') or (
+        'ndjson' if name.endswith(('.ndjson', '.jsonl')) or mimetype in ('application/x-ndjson', 'application/jsonl')
+        else 'csv'
+    )
+    if mode not in ('csv', 'ndjson'):
+        return jsonify({"success": False, "error": f"Неизвестный формат: {mode}"}), 400
+
+    text = open_text(stream)
+    rows = iter_ndjson_rows(text) if mode == 'ndjson' else iter_csv_rows(text)
+    imported = []
+    errors = []
+    error_count = 0
+    try:
+        for batch, batch_errors in iter_batches(rows):
+            imported.extend(batch)
+            error_count += len(batch_errors)
+            errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        # Файл целиком не читается — ничего не добавляем
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    for transaction in imported:
+        transaction["id"] = allocate_id(user_data, "transactions")
+    if imported:
+        add_user_records(current_user['id'], user_data, "transactions", imported)
+    print(f" Импортировано транзакций: {len(imported)}, ошибок: {error_count}")
+
+    return jsonify({
+        "success": True,
+        "imported": len(imported),
+        "error_count": error_count,
+        "errors": errors
+    })
+
 # API для экспорта CSV
 @app.route('/api/export/csv')
 @login_required
 @load_user_data_decorator
 def export_csv(user_data, current_user):
-    # Создаем CSV в памяти
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-
-    # Заголовок для транзакций
-    writer.writerow(["ТРАНЗАКЦИИ"])
-    writer.writerow(["ID", "Дата", "Тип", "Категория", "Сумма (₽)", "Описание"])
-
-    transactions = user_data.get("transactions", [])
-    for t in transactions:
-        if not isinstance(t, dict):
-            continue
-
-        writer.writerow([
-            t.get("id", ""),
-            t.get("date", ""),
-            "Доход" if t.get("type") == "income" else "Расход",
-            t.get("category", ""),
-            t.get("amount", 0),
-            t.get("description", "")
-        ])
-
-    # Возвращаем CSV файл
-    output.seek(0)
-
-    # Создаем ответ
-    response = send_file(
-        io.BytesIO(output.getvalue().encode('utf-8-sig')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='finance_export.csv'
+    """CSV потоком: ?sections=transactions,investments,goals (по умолчанию все), ?gzip=1 — со сжатием"""
+    sections = request.args.get('sections')
+    sections = sections.split(',') if sections else list(CSV_SECTIONS)
+    if not set(sections) <= set(CSV_SECTIONS):
+        return jsonify({"success": False, "error": f"Неизвестный раздел: {request.args['sections']}"}), 400
+
+    # Строки кодируются и отдаются кусками — файл целиком в памяти не собирается
+    download_name = 'finance_export.csv' if len(sections) > 1 else f'finance_{sections[0]}.csv'
+    return stream_download(
+        encode_chunks(iter_csv(user_data, sections), 'utf-8-sig'),
+        'text/csv',
+        download_name,
+        compress=request.args.get('gzip') == '1'
     )
 
-    return response
-
 # API для экспорта JSON
 @app.route('/api/export/json')
 @login_required
 @load_user_data_decorator
 def export_json(user_data, current_user):
-    # Создаем JSON в памяти
-    json_data = json.dumps(user_data, ensure_ascii=False, indent=2)
-    # Создаем ответ
-    response = send_file(
-        io.BytesIO(json_data.encode('utf-8')),
-        mimetype='application/json',
-        as_attachment=True,
-        download_name='finance_export.json'
+    """JSON потоком: ?format=pretty|compact|ndjson (по умолчанию pretty), ?gzip=1 — со сжатием"""
+    mode = request.args.get('format', 'pretty')
+    if mode not in JSON_FORMATS:
+        return jsonify({"success": False, "error": f"Неизвестный формат: {mode}"}), 400
+
+    # Записи кодируются по одной — документ целиком в памяти не собирается
+    ndjson = mode == "ndjson"
+    return stream_download(
+        iter_json(user_data, mode),
+        'application/x-ndjson' if ndjson else 'application/json',
+        'finance_export.ndjson' if ndjson else 'finance_export.json',
+        compress=request.args.get('gzip') == '1'
     )
 
-    return response
-
 
 # инвестиции
 @app.route('/investments')
@@ -739,23 +779,18 @@ def api_add_investment(user_data, current_user):
             current_value = amount
 
         investment = {
-            "id": len(user_data.get("investments", [])) + 1,
+            "id": allocate_id(user_data, "investments"),
             "name": request.form.get("name", ""),
             "type": request.form.get("type", "Акции"),
             "amount": amount,
             "current_value": current_value,
-            "purchase_date": request.form.get("purchase_date", datetime.now().strftime("%Y-%m-%d")),
+            "purchase_date": normalize_date(request.form.get("purchase_date") or datetime.now().strftime("%Y-%m-%d")),
             "expected_return": request.form.get("expected_return"),
             "notes": request.form.get("notes", ""),
             "added_date": datetime.now().strftime("%Y-%m-%d")
         }
 
-        # Инициализируем список инвестиций, если его нет
-        if "investments" not in user_data:
-            user_data["investments"] = []
-
-        user_data["investments"].append(investment)
-        save_user_data(current_user['id'], user_data)
+        add_user_record(current_user['id'], user_data, "investments", investment)
 
         return redirect("/investments")
 
@@ -866,20 +901,16 @@ def api_add_goal(user_data, current_user):
         saved = float(saved_str) if saved_str else 0.0
 
         goal = {
-            "id": len(user_data.get("goals", [])) + 1,
+            "id": allocate_id(user_data, "goals"),
             "name": request.form.get("name", ""),
             "description": request.form.get("description", ""),
             "target": target,
             "saved": saved,
-            "deadline": request.form.get("deadline", datetime.now().strftime("%Y-%m-%d")),
+            "deadline": normalize_date(request.form.get("deadline") or datetime.now().strftime("%Y-%m-%d")),
             "created_date": datetime.now().strftime("%Y-%m-%d"),
             "progress": (saved / target * 100) if target > 0 else 0
         }
-        if "goals" not in user_data:
-            user_data["goals"] = []
-
-        user_data["goals"].append(goal)
-        save_user_data(current_user['id'], user_data)
+        add_user_record(current_user['id'], user_data, "goals", goal)
 
         return redirect("/goals")
 
@@ -894,18 +925,17 @@ def api_add_to_goal(user_data, current_user, goal_id):
     try:
         amount = float(request.form.get("amount", 0))
 
-        goals = user_data.get("goals", [])
-        for goal in goals:
-            if isinstance(goal, dict) and goal.get("id") == goal_id:
-                current_saved = goal.get("saved", 0)
-                goal["saved"] = current_saved + amount
+        goal = get_user_record(user_data, "goals", goal_id)
+        if goal is not None:
+            current_saved = goal.get("saved", 0)
+            goal["saved"] = current_saved + amount
 
-                # Пересчитываем прогресс
-                target = goal.get("target", 1)
-                goal["progress"] = (goal["saved"] / target * 100) if target > 0 else 0
+            # Пересчитываем прогресс
+            target = goal.get("target", 1)
+            goal["progress"] = (goal["saved"] / target * 100) if target > 0 else 0
 
-                save_user_data(current_user['id'], user_data)
-                return jsonify({"success": True, "new_amount": goal["saved"]})
+            save_user_data(current_user['id'], user_data)
+            return jsonify({"success": True, "new_amount": goal["saved"]})
 
         return jsonify({"success": False, "error": "Цель не найдена"}), 404
 
@@ -918,19 +948,8 @@ def api_add_to_goal(user_data, current_user, goal_id):
 @load_user_data_decorator
 def api_delete_goal(user_data, current_user, goal_id):
     try:
-        goals = user_data.get("goals", [])
-        new_goals = []
-        deleted = False
-
-        for goal in goals:
-            if isinstance(goal, dict) and goal.get("id") == goal_id:
-                deleted = True
-                continue
-            new_goals.append(goal)
-
-        if deleted:
-            user_data["goals"] = new_goals
-            save_user_data(current_user['id'], user_data)
+        # Удаляется только эта цель, остальной список не перезаписывается
+        if delete_user_record(current_user['id'], user_data, "goals", goal_id):
             return jsonify({"success": True})
         else:
             return jsonify({"success": False, "error": "Цель не найдена"}), 404
@@ -945,11 +964,7 @@ def api_delete_goal(user_data, current_user, goal_id):
 def edit_goal_page(user_data, current_user):
     goal_id = int(request.args.get('id', 0))
 
-    goal = None
-    for g in user_data.get("goals", []):
-        if isinstance(g, dict) and g.get("id") == goal_id:
-            goal = g
-            break
+    goal = get_user_record(user_data, "goals", goal_id)
 
     if not goal:
         return redirect("/goals")
@@ -970,19 +985,19 @@ def api_edit_goal(user_data, current_user):
         goal_id = int(request.form.get("id", 0))
         target = float(request.form.get("target", 0))
         saved = float(request.form.get("saved", 0))
+        deadline = request.form.get("deadline", "")
+        deadline = normalize_date(deadline) if deadline else ""
+
+        goal = get_user_record(user_data, "goals", goal_id)
+        if goal is not None:
+            goal["name"] = request.form.get("name", "")
+            goal["description"] = request.form.get("description", "")
+            goal["target"] = target
+            goal["saved"] = saved
+            goal["deadline"] = deadline
+            goal["progress"] = (saved / target * 100) if target > 0 else 0
 
-        goals = user_data.get("goals", [])
-        for goal in goals:
-            if isinstance(goal, dict) and goal.get("id") == goal_id:
-                goal["name"] = request.form.get("name", "")
-                goal["description"] = request.form.get("description", "")
-                goal["target"] = target
-                goal["saved"] = saved
-                goal["deadline"] = request.form.get("deadline", "")
-                goal["progress"] = (saved / target * 100) if target > 0 else 0
-
-                save_user_data(current_user['id'], user_data)
-                return redirect("/goals")
+            save_user_data(current_user['id'], user_data)
 
         return redirect("/goals")
 
@@ -994,45 +1009,90 @@ def api_edit_goal(user_data, current_user):
 @login_required
 @load_user_data_decorator
 def reports_page(user_data, current_user):
-    transactions = user_data.get("transactions", [])
-    investments = user_data.get("investments", [])
-    goals = user_data.get("goals", [])
-
-    # Получаем данные для отчетов
-    monthly_data = get_monthly_summary(transactions)
-    expense_categories = get_category_summary(transactions, "expense")
-    income_categories = get_category_summary(transactions, "income")
-    investment_summary = get_investment_summary(investments)
-
-    # Общая статистика транзакций
-    total_income = sum(t.get("amount", 0) for t in transactions if isinstance(t, dict) and t.get("amount", 0) > 0)
-    total_expense = sum(abs(t.get("amount", 0)) for t in transactions if isinstance(t, dict) and t.get("amount", 0) < 0)
-    total_balance = total_income - total_expense
-
-    # Статистика целей
-    total_goals_target = sum(g.get("target", 0) for g in goals if isinstance(g, dict))
-    total_goals_saved = sum(g.get("saved", 0) for g in goals if isinstance(g, dict))
-    goals_progress = (total_goals_saved / total_goals_target * 100) if total_goals_target > 0 else 0
+    # Все данные отчета одним объектом: транзакции — из сводов хранилища,
+    # инвестиции и цели — за один проход
+    report = build_report(user_data)
 
     return render_template(
         'reports.html',
         current_title="Отчеты",
         current_user=current_user,
         current_year=datetime.now().year,
-        transactions=transactions,
-        investments=investments,
-        goals=goals,
-        monthly_data=monthly_data,
-        expense_categories=expense_categories,
-        income_categories=income_categories,
-        investment_summary=investment_summary,
-        total_income=total_income,
-        total_expense=total_expense,
-        total_balance=total_balance,
-        total_goals_target=total_goals_target,
-        total_goals_saved=total_goals_saved,
-        goals_progress=goals_progress
+        report=report
     )
+
+
+@app.route('/api/reports/monthly')
+@login_required
+@load_user_data_decorator
+def api_monthly_report(user_data, current_user):
+    """Сводка по месяцам за окно: ?from=ГГГГ-ММ&to=ГГГГ-ММ&months=N (по своду хранилища)"""
+    start = request.args.get('from') or None
+    end = request.args.get('to') or None
+    for value in (start, end):
+        if value is not None and month_key(value + "-01") != value:
+            return jsonify({"success": False, "error": f"Некорректный месяц: {value}"}), 400
+    try:
+        months = int(request.args['months']) if request.args.get('months') else None
+    except ValueError:
+        return jsonify({"success": False, "error": "Некорректное число месяцев"}), 400
+    if months is None and start is None and end is None:
+        months = 6
+
+    monthly_data = monthly_summary(user_data["monthly"], months, start, end)
+    # Список, а не объект: jsonify сортирует ключи, а месяцы идут от новых к старым
+    return jsonify({
+        "success": True,
+        "months": [{"month": month, **data} for month, data in monthly_data.items()]
+    })
+
+
+@app.route('/api/reports/categories')
+@login_required
+@load_user_data_decorator
+def api_category_report(user_data, current_user):
+    """Топ категорий: ?type=expense|income&limit=N (по своду хранилища)"""
+    trans_type = request.args.get('type', 'expense')
+    if trans_type not in ("income", "expense"):
+        return jsonify({"success": False, "error": f"Некорректный тип: {trans_type}"}), 400
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        return jsonify({"success": False, "error": "Некорректное число категорий"}), 400
+
+    categories = category_summary(user_data["by_category"], trans_type, limit)
+    return jsonify({
+        "success": True,
+        "type": trans_type,
+        "categories": [{"category": category, **data} for category, data in categories.items()]
+    })
+
+
+@app.route('/api/analytics/pivot')
+@login_required
+@load_user_data_decorator
+def api_analytics_pivot(user_data, current_user):
+    """Сводная таблица транзакций: ?rows=month&columns=category&from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД
+
+    Измерения: month, week, category, type; columns и период необязательны.
+    """
+    rows = request.args.get('rows', 'month')
+    columns = request.args.get('columns') or None
+    for dimension in (rows, columns):
+        if dimension is not None and dimension not in PIVOT_DIMENSIONS:
+            return jsonify({"success": False, "error": f"Неизвестное измерение: {dimension}"}), 400
+
+    period = []
+    for name in ('from', 'to'):
+        value = request.args.get(name) or None
+        day = parse_day(value) if value is not None else None
+        if day == 0:
+            return jsonify({"success": False, "error": f"Некорректная дата: {value}"}), 400
+        period.append(day)
+
+    table = transaction_columns(user_data).pivot(rows, columns, *period)
+    return jsonify({"success": True, "row_dimension": rows, "column_dimension": columns, **table})
+
 # СБРОС ДАННЫХ
 @app.route('/reset-data')
 @login_required
@@ -1080,7 +1140,8 @@ def api_reset_data():
                         "risk_profile": current_user.get("risk_profile", 2),
                         "transactions": [],  # Очищаем данные
                         "investments": [],
-                        "goals": []
+                        "goals": [],
+                        **compute_aggregates([])
                     }
                     break
         save_data(new_data)
@@ -1099,6 +1160,79 @@ def api_reset_data():
             "error": str(e)
         }), 500
 
+
+@app.route('/api/storage/stats')
+@login_required
+def api_storage_stats():
+    """Статистика хранилища (группировка отложенной записи, задержка записи)"""
+    return jsonify({"success": True, "backend": STORAGE_BACKEND, "stats": store.stats()})
+
+
+# МИГРАЦИЯ ХРАНИЛИЩА
+@app.cli.command('migrate-to-sqlite')
+@click.option('--json-file', default=DATA_FILE, show_default=True, help='Исходный JSON-файл')
+@click.option('--db-file', default=SQLITE_FILE, show_default=True, help='Файл базы SQLite (перезаписывается)')
+def migrate_to_sqlite_command(json_file, db_file):
+    """Перенос данных из JSON-файла в SQLite"""
+    from modules.sqlite_store import migrate_json_to_sqlite
+
+    counts = migrate_json_to_sqlite(json_file, db_file)
+    if counts is None:
+        raise click.ClickException("Не удалось записать данные в SQLite")
+
+    click.echo(
+        f" Перенесено в {db_file}: пользователей {counts['users']}, "
+        f"транзакций {counts['transactions']}, инвестиций {counts['investments']}, "
+        f"целей {counts['goals']}"
+    )
+    click.echo(" Для работы с базой запустите приложение с FINANCE_STORAGE=sqlite")
+
+
+@app.cli.command('migrate-to-shards')
+@click.option('--json-file', default=DATA_FILE, show_default=True, help='Исходный JSON-файл')
+@click.option('--data-dir', default=DATA_DIR, show_default=True, help='Каталог файлов пользователей')
+def migrate_to_shards_command(json_file, data_dir):
+    """Разбиение JSON-файла на файлы пользователей"""
+    from modules.sharded_store import migrate_json_to_shards
+
+    counts = migrate_json_to_shards(json_file, data_dir)
+    if counts is None:
+        raise click.ClickException("Не удалось записать файлы пользователей")
+
+    click.echo(
+        f" Перенесено в {data_dir}: пользователей {counts['users']}, "
+        f"транзакций {counts['transactions']}, инвестиций {counts['investments']}, "
+        f"целей {counts['goals']}"
+    )
+    click.echo(" Для работы с файлами запустите приложение с FINANCE_STORAGE=sharded")
+
+
+@app.cli.command('check-aggregates')
+@click.option('--repair', is_flag=True, help='Пересчитать расходящиеся итоги по транзакциям')
+def check_aggregates_command(repair):
+    """Сверка итогов пользователей (суммы, количество) с их транзакциями"""
+    from modules.aggregates import check_aggregates
+
+    users = store.load_data().get("users", [])
+    broken = 0
+    for user in users:
+        mismatched = check_aggregates(user)
+        if not mismatched:
+            continue
+        broken += 1
+        missing = [name for name in mismatched if user.get(name) is None]
+        click.echo(
+            f" {user.get('username')} (ID: {user.get('id')}): "
+            + (f"не сохранены {', '.join(missing)}" if missing else f"расходятся {', '.join(mismatched)}")
+        )
+        # Перезапись транзакций целиком — хранилище пересчитает итоги
+        if repair and not store.save_user_data(user["id"], store.load_user_data(user["id"]), {"transactions": None}):
+            raise click.ClickException(f"Не удалось пересчитать итоги пользователя {user.get('id')}")
+
+    click.echo(f" Проверено пользователей: {len(users)}, с расхождениями: {broken}")
+    if broken and repair:
+        click.echo(" Итоги пересчитаны")
+
 #ЗАПУСК ПРИЛОЖЕНИЯ
 if __name__ == '__main__':
     print("=" * 70)
@@ -1110,9 +1244,7 @@ if __name__ == '__main__':
     print(" Экспорт данных:        http://localhost:5000/export")
 
 
-    # Проверяем и создаем файл данных
-    if not os.path.exists(DATA_FILE):
-        print(" Создаем файл данных...")
-        save_data(create_default_data())
+    # Проверяем и создаем хранилище данных
+    store.initialize()
 
     app.run(debug=True, port=5000)
\ No newline at end of file
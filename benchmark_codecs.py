@@ -0,0 +1,86 @@
+"""Сравнение кодеков файла данных: время сохранения/загрузки и размер файла
+
+Запуск: python benchmark_codecs.py [--sizes 10000 100000 1000000] [--codecs json marshal+zlib]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from modules.serialization import available_codecs
+from modules.storage import create_default_data, read_file, write_file
+
+
+def generate_data(transactions_count, per_user=1000):
+    """Синтетические данные: transactions_count транзакций у пользователей по per_user штук"""
+    rng = random.Random(42)
+    data = create_default_data()
+    categories = data["categories"]
+    data["users"] = []
+
+    users_count = max(1, transactions_count // per_user)
+    for user_id in range(1, users_count + 1):
+        count = min(per_user, transactions_count - (user_id - 1) * per_user)
+        transactions = []
+        for i in range(count):
+            trans_type = "income" if rng.random() < 0.3 else "expense"
+            amount = round(rng.uniform(100, 50000), 2)
+            transactions.append({
+                "id": i + 1,
+                "date": f"{rng.randint(2019, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "type": trans_type,
+                "amount": amount if trans_type == "income" else -amount,
+                "description": f"Операция №{i + 1}",
+                "category": rng.choice(categories[trans_type]),
+            })
+        data["users"].append({
+            "id": user_id,
+            "username": f"user{user_id}",
+            "password_hash": "0" * 64,
+            "email": f"user{user_id}@example.com",
+            "created_at": "2024-01-01",
+            "risk_profile": 2,
+            "transactions": transactions,
+            "investments": [],
+            "goals": [],
+        })
+    return data
+
+
+def measure(func, repeat):
+    """Лучшее время из repeat запусков (секунды) и результат последнего"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Количество транзакций")
+    parser.add_argument("--codecs", nargs="+", default=available_codecs(), help="Кодеки для сравнения")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "finance_data.bin")
+        for size in args.sizes:
+            data = generate_data(size)
+            print(f"\n{size:,} транзакций")
+            print(f"{'кодек':<18} {'сохранение, с':>14} {'загрузка, с':>12} {'размер, МБ':>11}")
+            for codec in args.codecs:
+                save_time, _ = measure(lambda: write_file(path, data, codec), args.repeat)
+                file_size = os.path.getsize(path)
+                load_time, loaded = measure(lambda: read_file(path), args.repeat)
+                assert loaded == data, f"{codec}: данные после загрузки не совпадают"
+                print(f"{codec:<18} {save_time:>14.3f} {load_time:>12.3f} {file_size / 1024 / 1024:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
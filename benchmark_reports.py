@@ -0,0 +1,65 @@
+"""Сравнение построения страницы отчетов: прежние проходы по транзакциям и отчет по сводам
+
+Запуск: python benchmark_reports.py [--sizes 1000 10000 100000 1000000]
+"""
+import argparse
+
+from benchmark_codecs import generate_data, measure
+from modules.aggregates import compute_aggregates
+from modules.reports import build_report
+from modules.utils import get_category_summary, get_investment_summary, get_monthly_summary
+
+
+def legacy_report(user_data):
+    """Отчет как раньше в reports_page: отдельный проход на каждую сводку"""
+    transactions = user_data.get("transactions", [])
+    goals = user_data.get("goals", [])
+    total_goals_target = sum(g.get("target", 0) for g in goals if isinstance(g, dict))
+    total_goals_saved = sum(g.get("saved", 0) for g in goals if isinstance(g, dict))
+    return {
+        "monthly": get_monthly_summary(transactions),
+        "expense_categories": get_category_summary(transactions, "expense"),
+        "income_categories": get_category_summary(transactions, "income"),
+        "investment_summary": get_investment_summary(user_data.get("investments", [])),
+        "total_income": sum(t.get("amount", 0) for t in transactions if t.get("amount", 0) > 0),
+        "total_expense": abs(sum(t.get("amount", 0) for t in transactions if t.get("amount", 0) < 0)),
+        "goals_progress": (total_goals_saved / total_goals_target * 100) if total_goals_target > 0 else 0,
+    }
+
+
+def generate_user(transactions_count):
+    """Один пользователь с transactions_count транзакциями, инвестициями и целями"""
+    user = generate_data(transactions_count, per_user=max(1, transactions_count))["users"][0]
+    user["investments"] = [
+        {"id": i + 1, "type": ("Акции", "Облигации", "Другое")[i % 3], "amount": 1000.0 * (i + 1),
+         "current_value": 1100.0 * (i + 1)}
+        for i in range(20)
+    ]
+    user["goals"] = [{"id": i + 1, "target": 50000.0, "saved": 1000.0 * i} for i in range(10)]
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="Количество транзакций пользователя")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    print(f"{'транзакций':>12} {'прежний, мс':>12} {'пересчет сводов, мс':>20} {'по сводам, мс':>14}")
+    for size in args.sizes:
+        user = generate_user(size)
+        legacy_time, legacy = measure(lambda: legacy_report(user), args.repeat)
+        # Полный пересчет сводов за один проход (восстановление, данные без сводов)
+        rebuild_time, aggregates = measure(lambda: compute_aggregates(user["transactions"]), args.repeat)
+        user.update(aggregates)
+        report_time, report = measure(lambda: build_report(user), args.repeat)
+
+        assert list(report.monthly) == list(legacy["monthly"]), "сводка по месяцам не совпадает"
+        assert list(report.expense_categories) == list(legacy["expense_categories"]), "категории не совпадают"
+        assert abs(report.total_income - legacy["total_income"]) < 1e-6 * max(1.0, legacy["total_income"])
+        print(f"{size:>12,} {legacy_time * 1000:>12.2f} {rebuild_time * 1000:>20.2f} {report_time * 1000:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
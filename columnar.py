@@ -0,0 +1,208 @@
+from array import array
+from datetime import date
+
+from modules.dates import record_day
+from modules.derived import derived_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Коды типов транзакций в колонке types
+TYPE_CODES = {"income": 0, "expense": 1}
+OTHER_TYPE = -1
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+TYPE_NAMES[OTHER_TYPE] = "other"
+
+# Измерения сводной таблицы (pivot); для month и week нужны транзакции с датой
+PIVOT_DIMENSIONS = ("month", "week", "category", "type")
+DATE_DIMENSIONS = ("month", "week")
+# Порядковый номер дня 1970-01-01 (начало отсчета datetime64)
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+
+
+class TransactionColumns:
+    """Транзакции в параллельных массивах для аналитики без перебора словарей
+
+    amounts    — сумма (float64)
+    days       — дата как порядковый номер дня (int32, 0 — без даты)
+    types      — 0 доход, 1 расход, -1 другое (int8)
+    categories — код категории (int32), названия — в category_names
+    """
+
+    def __init__(self):
+        self.amounts = array('d')
+        self.days = array('i')
+        self.types = array('b')
+        self.categories = array('i')
+        self.category_names = []
+        self._category_codes = {}
+
+    @classmethod
+    def from_records(cls, transactions):
+        columns = cls()
+        columns.extend(transactions)
+        return columns
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def category_code(self, name):
+        """Код категории (новые названия добавляются в словарь)"""
+        code = self._category_codes.get(name)
+        if code is None:
+            code = self._category_codes[name] = len(self.category_names)
+            self.category_names.append(name)
+        return code
+
+    def extend(self, transactions):
+        """Добавление транзакций в конец колонок"""
+        for t in transactions:
+            if not isinstance(t, dict):
+                continue
+            amount = t.get("amount", 0)
+            self.amounts.append(amount if isinstance(amount, (int, float)) else 0.0)
+            self.days.append(record_day(t))
+            self.types.append(TYPE_CODES.get(t.get("type"), OTHER_TYPE))
+            self.categories.append(self.category_code(t.get("category", "Другое")))
+        return self
+
+    def nbytes(self):
+        """Память под колонки, байт"""
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.amounts, self.days, self.types, self.categories)
+        )
+
+    # СВОДНАЯ ТАБЛИЦА
+    def pivot(self, rows, columns=None, start=None, end=None):
+        """Суммы и количество транзакций в разрезе двух измерений (PIVOT_DIMENSIONS)
+
+        start/end — границы периода (порядковые номера дней, включительно).
+        Возвращает {"rows", "columns", "sum", "count"}: подписи строк и столбцов
+        и матрицы [строка][столбец]. Без columns — один столбец "total".
+        С NumPy группировка векторная (unique + bincount), без него — один проход по массивам.
+        """
+        dimensions = [rows] if columns is None else [rows, columns]
+        dated = start is not None or end is not None or any(d in DATE_DIMENSIONS for d in dimensions)
+        if np is not None:
+            labels, sums, counts = self._pivot_numpy(dimensions, dated, start, end)
+        else:
+            labels, sums, counts = self._pivot_arrays(dimensions, dated, start, end)
+        if columns is None:
+            labels.append(["total"])
+        return {
+            "rows": labels[0],
+            "columns": labels[1],
+            "sum": sums,
+            "count": counts,
+        }
+
+    def _pivot_numpy(self, dimensions, dated, start, end):
+        amounts = np.frombuffer(self.amounts, dtype=np.float64)
+        days = np.frombuffer(self.days, dtype=np.intc)
+        mask = np.ones(len(days), dtype=bool)
+        if dated:
+            mask &= days > 0
+        if start is not None:
+            mask &= days >= start
+        if end is not None:
+            mask &= days <= end
+        days = days[mask]
+
+        inverse = []
+        labels = []
+        for dimension in dimensions:
+            if dimension == "month":
+                values = (days.astype(np.int64) - EPOCH_DAY).astype('datetime64[D]').astype('datetime64[M]')
+                unique, codes = np.unique(values, return_inverse=True)
+                names = [str(value) for value in unique]
+            elif dimension == "week":
+                # Порядковый номер 1 — понедельник, неделя начинается с понедельника
+                unique, codes = np.unique(days - (days - 1) % 7, return_inverse=True)
+                names = [date.fromordinal(int(value)).isoformat() for value in unique]
+            elif dimension == "category":
+                unique, codes = np.unique(np.frombuffer(self.categories, dtype=np.intc)[mask], return_inverse=True)
+                names = [self.category_names[value] for value in unique.tolist()]
+            else:
+                unique, codes = np.unique(np.frombuffer(self.types, dtype=np.int8)[mask], return_inverse=True)
+                names = [TYPE_NAMES[value] for value in unique.tolist()]
+            inverse.append(codes.reshape(-1))
+            labels.append(names)
+
+        width = len(labels[1]) if len(dimensions) > 1 else 1
+        key = inverse[0] * width + (inverse[1] if len(dimensions) > 1 else 0)
+        shape = (len(labels[0]), width)
+        sums = np.bincount(key, weights=amounts[mask], minlength=shape[0] * width).reshape(shape)
+        counts = np.bincount(key, minlength=shape[0] * width).reshape(shape)
+        return labels, sums.tolist(), counts.tolist()
+
+    def _pivot_arrays(self, dimensions, dated, start, end):
+        months = {}
+
+        def month(day):
+            # Коды месяцев по возрастанию совпадают с хронологическим порядком
+            code = months.get(day)
+            if code is None:
+                value = date.fromordinal(day)
+                code = months[day] = value.year * 12 + value.month - 1
+            return code
+
+        code_of = {
+            "month": lambda i: month(self.days[i]),
+            "week": lambda i: self.days[i] - (self.days[i] - 1) % 7,
+            "category": lambda i: self.categories[i],
+            "type": lambda i: self.types[i],
+        }
+        row_code = code_of[dimensions[0]]
+        column_code = code_of[dimensions[1]] if len(dimensions) > 1 else lambda i: 0
+
+        cells = {}
+        for i, day in enumerate(self.days):
+            if (dated and not day) or (start is not None and day < start) or (end is not None and day > end):
+                continue
+            key = (row_code(i), column_code(i))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0.0, 0]
+            cell[0] += self.amounts[i]
+            cell[1] += 1
+
+        codes = [sorted({key[axis] for key in cells}) for axis in range(2)]
+        names = {
+            "month": lambda code: f"{code // 12:04d}-{code % 12 + 1:02d}",
+            "week": lambda code: date.fromordinal(code).isoformat(),
+            "category": lambda code: self.category_names[code],
+            "type": lambda code: TYPE_NAMES[code],
+        }
+        labels = [[names[dimension](code) for code in codes[axis]] for axis, dimension in enumerate(dimensions)]
+        if len(dimensions) == 1:
+            codes[1] = [0]
+        sums = [[cells.get((r, c), (0.0, 0))[0] for c in codes[1]] for r in codes[0]]
+        counts = [[cells.get((r, c), (0.0, 0))[1] for c in codes[1]] for r in codes[0]]
+        return labels, sums, counts
+
+
+def _apply_changes(columns, changes):
+    """Добавленные транзакции дописываются в колонки; изменение или удаление — перестроить"""
+    if "transactions" not in changes:
+        return True
+    change = changes["transactions"]
+    if change is None or change.get("updated") or change.get("removed"):
+        return False
+    columns.extend(change.get("added", []))
+    return True
+
+
+derived_cache.register(
+    "columns",
+    lambda user_data: TransactionColumns.from_records(user_data.get("transactions", [])),
+    _apply_changes
+)
+
+
+def transaction_columns(user_data):
+    """Колонки транзакций пользователя (строятся один раз для версии данных)"""
+    return derived_cache.get("columns", user_data)
@@ -0,0 +1,140 @@
+from flask import g, has_request_context, request
+
+from modules.derived import derived_cache
+from modules.storage import merge_changes, normalize_changes
+from modules.tracking import TrackedUserData
+
+
+class RequestDataContext:
+    """Единица работы запроса: данные читаются один раз и сохраняются не более одного раза"""
+
+    def __init__(self, store):
+        self.store = store
+        self._data = None
+        self._data_dirty = False
+        self._users = {}
+        self._user_data = {}
+        # Несохраненные изменения пользователей: user_id -> описание изменений
+        self._changes = {}
+        # Пользователи, чьи отслеживаемые данные нужно сохранить
+        self._tracked = set()
+
+    @property
+    def dirty(self):
+        return self._data_dirty or bool(self._changes) or bool(self._tracked)
+
+    def load_data(self):
+        """Все данные (читаются при первом обращении)"""
+        if self._data is None:
+            self._data = self.store.load_data()
+        return self._data
+
+    def save_data(self, data):
+        """Отложенная полная перезапись данных"""
+        self._data = data
+        self._data_dirty = True
+        return True
+
+    def get_user(self, user_id):
+        """Пользователь по ID (читается один раз за запрос)"""
+        if user_id not in self._users:
+            self._users[user_id] = self.store.get_user(user_id)
+        return self._users[user_id]
+
+    def load_user_data(self, user_id):
+        """Данные пользователя (читаются один раз за запрос, изменения отслеживаются)"""
+        if user_id not in self._user_data:
+            user_data = self.store.load_user_data(user_id)
+            self._user_data[user_id] = TrackedUserData(user_data) if user_data is not None else None
+        return self._user_data[user_id]
+
+    def save_user_data(self, user_id, user_data, changes=None):
+        """Отложенное сохранение: изменения будут записаны в конце запроса"""
+        self._user_data[user_id] = user_data
+        if isinstance(user_data, TrackedUserData):
+            # Что именно изменилось, станет известно из журнала изменений при записи
+            self._tracked.add(user_id)
+            return True
+
+        changes = normalize_changes(user_data, changes)
+        self._changes[user_id] = merge_changes(self._changes.get(user_id, {}), changes)
+        return True
+
+    def discard(self):
+        """Отказ от несохраненных изменений"""
+        was_dirty = self.dirty
+        if was_dirty:
+            self.store.invalidate()
+        self._data = None
+        self._data_dirty = False
+        self._users.clear()
+        self._user_data.clear()
+        self._changes.clear()
+        self._tracked.clear()
+        return was_dirty
+
+    def flush(self, wait=False):
+        """Запись изменений (если они были); wait — дождаться записи на диск"""
+        ok = True
+        if self._data_dirty:
+            ok = self.store.save_data(self._data)
+            self._data_dirty = False
+            derived_cache.discard()
+
+        changes, self._changes = self._changes, {}
+        for user_id in self._tracked:
+            changes[user_id] = merge_changes(changes.get(user_id, {}), self._user_data[user_id].changes())
+        self._tracked = set()
+
+        for user_id, user_changes in changes.items():
+            # Ничего не изменилось — не пишем вовсе
+            if not user_changes:
+                continue
+            if self.store.save_user_data(user_id, self._user_data[user_id], user_changes):
+                # Кэшированные колонки и индексы пользователя обновляются на месте
+                derived_cache.saved(user_id, self._user_data[user_id], user_changes)
+            else:
+                derived_cache.discard(user_id)
+                ok = False
+
+        # При отложенной записи изменения пока только в памяти
+        if wait and not self.store.sync():
+            ok = False
+        return ok
+
+
+def get_data_context(store):
+    """Контекст данных текущего запроса (None вне запроса)"""
+    if not has_request_context():
+        return None
+    if 'data_context' not in g:
+        g.data_context = RequestDataContext(store)
+    return g.data_context
+
+
+def init_data_context(app):
+    """Регистрирует запись изменений в конце каждого запроса"""
+
+    @app.after_request
+    def flush_data_context(response):
+        context = g.pop('data_context', None)
+        if context is None:
+            return response
+
+        # Ответ с ошибкой сервера — изменения запроса не сохраняем
+        if response.status_code >= 500:
+            context.discard()
+            return response
+
+        # Клиент может попросить ответить только после записи на диск
+        wait = request.headers.get('X-Durable-Write') == '1'
+        if not context.flush(wait=wait):
+            print(" Ошибка при сохранении данных запроса")
+        return response
+
+    @app.teardown_request
+    def discard_data_context(exc):
+        # Сюда попадаем с контекстом, только если after_request не выполнялся
+        context = g.pop('data_context', None)
+        if context is not None:
+            context.discard()
@@ -0,0 +1,59 @@
+from datetime import date, datetime
+from functools import lru_cache
+
+
+ISO_FORMAT = '%Y-%m-%d'
+
+
+def _is_iso(value):
+    return isinstance(value, str) and len(value) == 10 and value[4] == "-" and value[7] == "-"
+
+
+def parse_day(value):
+    """Дата 'ГГГГ-ММ-ДД' -> порядковый номер дня (0, если даты нет или она некорректна)"""
+    if not value:
+        return 0
+    if _is_iso(value):
+        try:
+            return date.fromisoformat(value).toordinal()
+        except ValueError:
+            return 0
+    try:
+        # strptime принимает и даты без ведущих нулей (2024-1-5)
+        return datetime.strptime(value, ISO_FORMAT).toordinal()
+    except (TypeError, ValueError):
+        return 0
+
+
+def normalize_date(value):
+    """Дата из формы или импорта -> 'ГГГГ-ММ-ДД' (ValueError, если дата некорректна)
+
+    Даты записываются только в этом виде, чтобы чтение всегда шло по быстрому пути.
+    """
+    day = parse_day(value.strip() if isinstance(value, str) else value)
+    if not day:
+        raise ValueError(f"Некорректная дата: {value}")
+    return date.fromordinal(day).isoformat()
+
+
+def record_day(record, field="date"):
+    """Порядковый номер дня записи: сохраненный при записи (day) или разобранный из даты"""
+    day = record.get("day")
+    if isinstance(day, int):
+        return day
+    return parse_day(record.get(field))
+
+
+@lru_cache(maxsize=8192)
+def _format_iso(value, format_to):
+    return date.fromisoformat(value).strftime(format_to)
+
+
+def format_iso_date(value, format_to='%d.%m.%Y'):
+    """Дата 'ГГГГ-ММ-ДД' для отображения с запоминанием (None — строка не в этом формате)"""
+    if not _is_iso(value):
+        return None
+    try:
+        return _format_iso(value, format_to)
+    except ValueError:
+        return value
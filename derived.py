@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+from modules.storage import USER_COLLECTIONS
+
+
+class DerivedCache:
+    """Производные структуры данных пользователя (колонки, индексы), общие для запросов процесса
+
+    Структура строится один раз для версии данных пользователя (user_data["version"]).
+    Изменения, сохраненные этим процессом, применяются к ней на месте, если это умеет
+    ее обработчик; после записи другого воркера версия не совпадет и структура
+    построится заново.
+    """
+
+    # Сколько структур держать в памяти (давно не использованные вытесняются)
+    MAX_ENTRIES = 1024
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # name -> (build(user_data), apply(value, changes) -> bool)
+        self._kinds = {}
+        # (user_id, name) -> [версия, число транзакций, структура]
+        self._entries = OrderedDict()
+
+    def register(self, name, build, apply=None):
+        """Новый вид структуры; apply обновляет ее по описанию изменений (False — перестроить)"""
+        self._kinds[name] = (build, apply)
+
+    @staticmethod
+    def _key(user_data):
+        return user_data.get("version", 0), len(user_data.get("transactions", []))
+
+    def get(self, name, user_data):
+        """Структура для данных пользователя (строится, если ее нет или данные изменились)"""
+        user_id = (user_data.get("user_info") or {}).get("id")
+        version, count = self._key(user_data)
+        with self._lock:
+            entry = self._entries.get((user_id, name))
+            if entry is not None and entry[0] == version and entry[1] == count:
+                self._entries.move_to_end((user_id, name))
+                return entry[2]
+
+        value = self._kinds[name][0](user_data)
+        with self._lock:
+            self._entries[(user_id, name)] = [version, count, value]
+            self._entries.move_to_end((user_id, name))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def saved(self, user_id, user_data, changes):
+        """Изменения пользователя записаны: структуры той же версии обновляются на месте"""
+        if not any(name in USER_COLLECTIONS for name in changes):
+            return  # Версия данных не меняется
+        version = user_data.get("version", 0)
+        added = len((changes.get("transactions") or {}).get("added", []))
+        # Структура, построенная уже с добавленными записями, обновлению не подлежит
+        count = len(user_data.get("transactions", [])) - added
+        with self._lock:
+            for (entry_user, name), entry in list(self._entries.items()):
+                if entry_user != user_id:
+                    continue
+                apply = self._kinds[name][1]
+                # Хранилище присвоит сохраненным данным версию version + 1
+                if entry[0] == version and entry[1] == count and apply is not None and apply(entry[2], changes):
+                    entry[0] = version + 1
+                    entry[1] += added
+                else:
+                    del self._entries[(entry_user, name)]
+
+    def discard(self, user_id=None):
+        """Сброс структур пользователя (или всех)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+
+# Общий кэш процесса
+derived_cache = DerivedCache()
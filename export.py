@@ -0,0 +1,174 @@
+import codecs
+import csv
+import io
+import itertools
+import json
+import zlib
+
+from flask import Response, request
+
+from modules.serialization import dumps_json
+from modules.storage import USER_COLLECTIONS, USER_STATE_KEYS
+
+
+# Сколько текста копить перед отправкой очередного куска ответа
+CHUNK_SIZE = 64 * 1024
+
+# Разделы CSV-экспорта: имя -> (заголовок раздела, колонки, строка по записи)
+CSV_SECTIONS = {
+    "transactions": (
+        "ТРАНЗАКЦИИ",
+        ["ID", "Дата", "Тип", "Категория", "Сумма (₽)", "Описание"],
+        lambda t: [
+            t.get("id", ""),
+            t.get("date", ""),
+            "Доход" if t.get("type") == "income" else "Расход",
+            t.get("category", ""),
+            t.get("amount", 0),
+            t.get("description", "")
+        ]
+    ),
+    "investments": (
+        "ИНВЕСТИЦИИ",
+        ["ID", "Название", "Тип", "Сумма (₽)", "Текущая стоимость (₽)", "Дата покупки", "Заметки"],
+        lambda inv: [
+            inv.get("id", ""),
+            inv.get("name", ""),
+            inv.get("type", ""),
+            inv.get("amount", 0),
+            inv.get("current_value", inv.get("amount", 0)),
+            inv.get("purchase_date", ""),
+            inv.get("notes", "")
+        ]
+    ),
+    "goals": (
+        "ЦЕЛИ",
+        ["ID", "Название", "Описание", "Цель (₽)", "Накоплено (₽)", "Срок"],
+        lambda g: [
+            g.get("id", ""),
+            g.get("name", ""),
+            g.get("description", ""),
+            g.get("target", 0),
+            g.get("saved", 0),
+            g.get("deadline", "")
+        ]
+    ),
+}
+
+
+def iter_csv(user_data, sections=tuple(CSV_SECTIONS)):
+    """CSV-экспорт кусками текста (не больше CHUNK_SIZE с небольшим запасом)
+
+    Разделы идут друг за другом: строка-заголовок раздела, колонки, записи, пустая строка.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    for i, name in enumerate(sections):
+        title, columns, row = CSV_SECTIONS[name]
+        if i:
+            writer.writerow([])
+        writer.writerow([title])
+        writer.writerow(columns)
+        for record in user_data.get(name, []):
+            if not isinstance(record, dict):
+                continue
+            writer.writerow(row(record))
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Форматы JSON-экспорта: pretty — как прежде (отступ 2), compact — без пробелов,
+# ndjson — по строке на запись: {"collection": ..., "record": ...}
+JSON_FORMATS = ("pretty", "compact", "ndjson")
+
+
+def _compact_object(user_data):
+    """Компактный объект верхнего уровня по частям; коллекции — по записи за раз"""
+    yield b"{"
+    for i, (key, value) in enumerate(user_data.items()):
+        yield (b"," if i else b"") + dumps_json(key) + b":"
+        if key in USER_COLLECTIONS and isinstance(value, list):
+            yield b"["
+            for j, record in enumerate(value):
+                yield (b"," if j else b"") + dumps_json(record)
+            yield b"]"
+        else:
+            yield dumps_json(value)
+    yield b"}"
+
+
+def iter_json(user_data, mode="pretty"):
+    """JSON-экспорт данных пользователя кусками байтов (не больше CHUNK_SIZE с запасом)
+
+    Записи коллекций кодируются по одной, весь документ в памяти не собирается.
+    Служебные поля хранилища (счетчики, версия, итоги) в экспорт не входят.
+    """
+    user_data = {key: value for key, value in user_data.items() if key not in USER_STATE_KEYS}
+    if mode == "ndjson":
+        header = {key: value for key, value in user_data.items() if key not in USER_COLLECTIONS}
+        parts = itertools.chain(
+            [dumps_json({"collection": "user", "record": header}) + b"\n"],
+            (
+                dumps_json({"collection": name, "record": record}) + b"\n"
+                for name in USER_COLLECTIONS
+                for record in user_data.get(name, [])
+            )
+        )
+    elif mode == "compact":
+        # Запись целиком кодирует быстрый однопроходный кодировщик
+        parts = _compact_object(user_data)
+    else:
+        # Тот же вывод, что json.dumps(indent=2), но по мере кодирования
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+        for chunk in _buffered(encoder.iterencode(user_data)):
+            yield chunk.encode('utf-8')
+        return
+    yield from _buffered(parts)
+
+
+def _buffered(parts):
+    """Склейка мелких кусков (строк или байтов) в куски около CHUNK_SIZE"""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield buffer[0][:0].join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield buffer[0][:0].join(buffer)
+
+
+def encode_chunks(chunks, encoding='utf-8'):
+    """Текстовые куски -> байты (utf-8-sig: метка BOM только в начале потока)"""
+    if encoding == 'utf-8-sig':
+        yield codecs.BOM_UTF8
+        encoding = 'utf-8'
+    for chunk in chunks:
+        yield chunk.encode(encoding)
+
+
+def gzip_chunks(chunks, level=6):
+    """Сжатие потока байтов в gzip по мере поступления"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_download(chunks, mimetype, filename, compress=False):
+    """Потоковый ответ-файл из кусков байтов; compress — gzip, если клиент его принимает"""
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if compress and "gzip" in request.headers.get("Accept-Encoding", ""):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return Response(chunks, mimetype=mimetype, headers=headers)
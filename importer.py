@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import math
+
+from modules.dates import normalize_date, parse_day
+from modules.export import CSV_SECTIONS
+
+
+# Сколько строк проверять и добавлять за раз
+BATCH_SIZE = 1000
+# Сколько ошибок по строкам возвращать в ответе (остальные только считаются)
+MAX_REPORTED_ERRORS = 1000
+
+# Колонки CSV (как в экспорте, можно и по-английски) -> поле транзакции
+CSV_COLUMNS = {
+    "id": "id",
+    "дата": "date",
+    "date": "date",
+    "тип": "type",
+    "type": "type",
+    "категория": "category",
+    "category": "category",
+    "сумма (₽)": "amount",
+    "сумма": "amount",
+    "amount": "amount",
+    "описание": "description",
+    "description": "description",
+}
+TYPE_NAMES = {"доход": "income", "income": "income", "расход": "expense", "expense": "expense"}
+TRANSACTIONS_TITLE = CSV_SECTIONS["transactions"][0]
+
+
+def _amount(value):
+    if isinstance(value, bool):
+        raise ValueError(f"Некорректная сумма: {value}")
+    if isinstance(value, str):
+        value = value.strip().replace("\xa0", "").replace(" ", "").replace(",", ".")
+    amount = float(value)
+    if not math.isfinite(amount):
+        raise ValueError(f"Некорректная сумма: {value}")
+    return amount
+
+
+def normalize_transaction(row):
+    """Строка импорта -> транзакция без ID (ValueError с причиной, если строка некорректна)
+
+    Тип — доход/расход (или по знаку суммы, если тип не указан); сумма расхода
+    сохраняется отрицательной, как при добавлении через форму.
+    """
+    if row.get("amount") in (None, ""):
+        raise ValueError("Не указана сумма")
+    try:
+        amount = _amount(row["amount"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Некорректная сумма: {row['amount']}")
+
+    type_name = str(row.get("type") or "").strip().casefold()
+    if type_name:
+        trans_type = TYPE_NAMES.get(type_name)
+        if trans_type is None:
+            raise ValueError(f"Неизвестный тип: {row['type']}")
+    else:
+        trans_type = "expense" if amount < 0 else "income"
+    amount = -abs(amount) if trans_type == "expense" else abs(amount)
+
+    if not row.get("date"):
+        raise ValueError("Не указана дата")
+    trans_date = normalize_date(row["date"])
+
+    return {
+        "date": trans_date,
+        "day": parse_day(trans_date),
+        "type": trans_type,
+        "amount": amount,
+        "description": str(row.get("description") or ""),
+        "category": str(row.get("category") or "Другое"),
+    }
+
+
+def iter_csv_rows(stream):
+    """Строки раздела транзакций CSV: (номер строки, {поле: значение})
+
+    Формат — как у экспорта: ';', необязательная строка-заголовок раздела, строка колонок;
+    раздел заканчивается пустой строкой (дальше в экспорте идут инвестиции и цели).
+    """
+    reader = csv.reader(stream, delimiter=';')
+    fields = None
+    for row in reader:
+        if fields is None:
+            if not row or (len(row) == 1 and row[0].strip() == TRANSACTIONS_TITLE):
+                continue
+            fields = [CSV_COLUMNS.get(name.strip().casefold()) for name in row]
+            if "amount" not in fields:
+                raise ValueError("В первой строке CSV нет колонки суммы")
+            continue
+        if not any(cell.strip() for cell in row):
+            break
+        yield reader.line_num, {field: value for field, value in zip(fields, row) if field}
+
+
+def iter_ndjson_rows(stream):
+    """Строки NDJSON: транзакция на строку (или запись экспорта {"collection", "record"})"""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Некорректный JSON: {e}")
+            continue
+        if isinstance(row, dict) and "collection" in row and "record" in row:
+            if row["collection"] != "transactions":
+                continue  # Прочие записи экспорта (пользователь, инвестиции, цели)
+            row = row["record"]
+        if not isinstance(row, dict):
+            yield line_number, ValueError("Строка должна быть объектом JSON")
+            continue
+        yield line_number, row
+
+
+def iter_batches(rows, batch_size=BATCH_SIZE):
+    """Проверенные транзакции пачками: (транзакции, ошибки [{line, error}])"""
+    batch = []
+    errors = []
+    for line_number, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append(normalize_transaction(row))
+        except ValueError as e:
+            errors.append({"line": line_number, "error": str(e)})
+        if len(batch) + len(errors) >= batch_size:
+            yield batch, errors
+            batch, errors = [], []
+    if batch or errors:
+        yield batch, errors
+
+
+def open_text(binary_stream):
+    """Текстовый поток поверх загруженного файла (UTF-8, с BOM или без)"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
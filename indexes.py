@@ -0,0 +1,287 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from datetime import date
+
+from modules.dates import parse_day, record_day
+from modules.derived import derived_cache
+
+
+class TransactionIndex:
+    """Транзакции пользователя, упорядоченные по (день, ID), и списки вхождений для фильтров
+
+    keys — все ключи (день, ID) по возрастанию; postings — такие же отсортированные списки
+    ключей по категории ("category", название) и типу ("type", тип). Добавление — bisect.insort,
+    выборка — bisect по периоду и курсору в самом коротком списке и пересечение с остальными.
+    Транзакции без даты или с некорректной датой идут с днем 0 — в конце списка.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.records = {}
+        self.postings = {}
+
+    @classmethod
+    def from_records(cls, transactions):
+        index = cls()
+        for record in transactions:
+            key = cls._key(record)
+            if key is not None and key[1] not in index.records:
+                index.keys.append(key)
+                index.records[key[1]] = record
+                for term in cls._terms(record):
+                    index.postings.setdefault(term, []).append(key)
+        index.keys.sort()
+        for keys in index.postings.values():
+            keys.sort()
+        return index
+
+    @staticmethod
+    def _key(record):
+        if not isinstance(record, dict) or not isinstance(record.get("id"), int):
+            return None
+        return record_day(record), record["id"]
+
+    @staticmethod
+    def _terms(record):
+        return ("category", record.get("category", "Другое")), ("type", record.get("type"))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, record):
+        key = self._key(record)
+        if key is None:
+            return
+        self.remove(key[1])
+        insort(self.keys, key)
+        for term in self._terms(record):
+            insort(self.postings.setdefault(term, []), key)
+        self.records[key[1]] = record
+
+    def remove(self, record_id):
+        record = self.records.pop(record_id, None)
+        if record is None:
+            return
+        key = self._key(record)
+        for term in self._terms(record):
+            keys = self.postings[term]
+            _discard(keys, key)
+            if not keys:
+                del self.postings[term]
+        _discard(self.keys, key)
+
+    def page(self, before=None, limit=50, start=None, end=None, category=None, trans_type=None,
+             min_amount=None, max_amount=None):
+        """Страница от новых к старым: (записи, курсор следующей страницы или None)
+
+        before — курсор (день, ID): берутся записи строго старше него; start/end — период
+        (порядковые номера дней, включительно; записи без даты в период не входят);
+        min_amount/max_amount — по модулю суммы.
+        """
+        lists = [self.keys]
+        for term, value in (("category", category), ("type", trans_type)):
+            if value is not None:
+                lists.append(self.postings.get((term, value), []))
+        lists.sort(key=len)
+        base, others = lists[0], lists[1:]
+
+        if start is None and end is not None:
+            start = 1
+        lower = bisect_left(base, (start,)) if start is not None else 0
+        upper = bisect_left(base, (end + 1,)) if end is not None else len(base)
+        if before is not None:
+            upper = min(upper, bisect_left(base, before))
+
+        records = []
+        for i in range(upper - 1, lower - 1, -1):
+            key = base[i]
+            if not all(_contains(keys, key) for keys in others):
+                continue
+            record = self.records[key[1]]
+            if min_amount is not None or max_amount is not None:
+                amount = abs(record.get("amount", 0))
+                if (min_amount is not None and amount < min_amount) or (max_amount is not None and amount > max_amount):
+                    continue
+            records.append(record)
+            if len(records) == limit:
+                return records, (key if i > lower else None)
+        return records, None
+
+
+def _contains(keys, key):
+    i = bisect_left(keys, key)
+    return i < len(keys) and keys[i] == key
+
+
+def _discard(keys, key):
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+def format_cursor(key):
+    """Курсор страницы для URL: 'ГГГГ-ММ-ДД,ID' (',ID' — у записи без даты)"""
+    if key is None:
+        return None
+    return f"{date.fromordinal(key[0]).isoformat() if key[0] else ''},{key[1]}"
+
+
+def parse_cursor(value):
+    """'ГГГГ-ММ-ДД,ID' или ',ID' -> (день, ID) (ValueError, если курсор некорректен)"""
+    date_str, separator, record_id = (value or "").partition(",")
+    day = parse_day(date_str) if date_str else 0
+    if not separator or (date_str and not day):
+        raise ValueError(f"Некорректный курсор: {value}")
+    return day, int(record_id)
+
+
+def _apply_changes(index, changes):
+    """Добавление, изменение и удаление транзакций — точечно, по bisect"""
+    if "transactions" not in changes:
+        return True
+    change = changes["transactions"]
+    if change is None:
+        return False
+    for record in change.get("added", []):
+        index.add(record)
+    for record in change.get("updated", []):
+        index.add(record)
+    for record_id in change.get("removed", []):
+        index.remove(record_id)
+    return True
+
+
+derived_cache.register(
+    "transactions",
+    lambda user_data: TransactionIndex.from_records(user_data.get("transactions", [])),
+    _apply_changes
+)
+
+
+def transaction_index(user_data):
+    """Индекс транзакций по дате, категории и типу (строится один раз для версии данных)"""
+    return derived_cache.get("transactions", user_data)
+
+
+# ПОЛНОТЕКСТОВЫЙ ПОИСК
+# Поля записей, по которым ищет /api/search
+SEARCH_FIELDS = {
+    "transactions": ("description",),
+    "investments": ("name", "notes"),
+    "goals": ("name", "description"),
+}
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре (casefold понимает кириллицу; ё = е)"""
+    if not isinstance(text, str):
+        return []
+    return _WORD.findall(text.casefold().replace("ё", "е"))
+
+
+class SearchIndex:
+    """Обратный индекс: слово -> множество записей (ID, коллекция)
+
+    Словарь слов хранится отсортированным, поэтому префиксный поиск — bisect по словарю,
+    без перебора описаний. Запрос находит записи, где каждое слово запроса — начало
+    какого-то слова записи; выше идут записи, где все слова запроса совпали целиком,
+    среди равных — более новые (с большим ID).
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.documents = {}
+
+    @classmethod
+    def from_user_data(cls, user_data):
+        index = cls()
+        for collection in SEARCH_FIELDS:
+            for record in user_data.get(collection, []):
+                index.add(collection, record, sort=False)
+        index.vocabulary.sort()
+        return index
+
+    def add(self, collection, record, sort=True):
+        if not isinstance(record, dict) or not isinstance(record.get("id"), int):
+            return
+        doc = (record["id"], collection)
+        self.remove(collection, record["id"])
+        tokens = {token for field in SEARCH_FIELDS[collection] for token in tokenize(record.get(field))}
+        self.documents[doc] = (record, tokens)
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = set()
+                if sort:
+                    insort(self.vocabulary, token)
+                else:
+                    self.vocabulary.append(token)
+            posting.add(doc)
+
+    def remove(self, collection, record_id):
+        doc = (record_id, collection)
+        entry = self.documents.pop(doc, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            posting = self.postings[token]
+            posting.discard(doc)
+            if not posting:
+                del self.postings[token]
+                _discard(self.vocabulary, token)
+
+    def _prefix_tokens(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        end = bisect_left(self.vocabulary, prefix + "\U0010ffff")
+        return self.vocabulary[start:end]
+
+    def search(self, query, limit=20, collections=None):
+        """Лучшие limit записей: [(оценка, коллекция, запись)]; оценка 2 — все слова целиком, 1 — по началу"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        matched = []
+        exact = []
+        for term in terms:
+            tokens = self._prefix_tokens(term)
+            if not tokens:
+                return []
+            postings = [self.postings[token] for token in tokens]
+            matched.append(postings[0] if len(postings) == 1 else set().union(*postings))
+            exact.append(self.postings.get(term, set()))
+
+        # Пересечение множеств — от меньшего к большему
+        found = set.intersection(*sorted(matched, key=len))
+        if collections is not None:
+            found = {doc for doc in found if doc[1] in collections}
+        best = found.intersection(*exact)
+        results = [(2, doc) for doc in heapq.nlargest(limit, best)]
+        if len(results) < limit:
+            results += [(1, doc) for doc in heapq.nlargest(limit - len(results), found - best)]
+        return [(score, doc[1], self.documents[doc][0]) for score, doc in results]
+
+
+def _apply_search_changes(index, changes):
+    """Изменения коллекций — точечно по записям; полная перезапись коллекции — перестроить"""
+    for collection in SEARCH_FIELDS:
+        if collection not in changes:
+            continue
+        change = changes[collection]
+        if change is None:
+            return False
+        for record in change.get("added", []) + change.get("updated", []):
+            index.add(collection, record)
+        for record_id in change.get("removed", []):
+            index.remove(collection, record_id)
+    return True
+
+
+derived_cache.register("search", SearchIndex.from_user_data, _apply_search_changes)
+
+
+def search_index(user_data):
+    """Полнотекстовый индекс пользователя (строится один раз для версии данных)"""
+    return derived_cache.get("search", user_data)
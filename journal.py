@@ -0,0 +1,124 @@
+import json
+import os
+
+from modules.aggregates import update_aggregates
+from modules.storage import remove_records, replace_records
+
+
+def journal_entries(changes, user_data, seq):
+    """Записи журнала для описания изменений (seq — последний занятый номер)"""
+    entries = []
+    for name, change in changes.items():
+        if name == "user_info":
+            continue
+        if change is None:
+            # Коллекция или служебное поле целиком
+            seq += 1
+            entries.append({"seq": seq, "collection": name, "op": "replace", "records": user_data[name]})
+            continue
+        for op in ("added", "updated", "removed"):
+            if change.get(op):
+                seq += 1
+                entries.append({"seq": seq, "collection": name, "op": op, "records": change[op]})
+    return entries
+
+
+def apply_journal_entry(data, entry):
+    """Применение записи журнала к снимку данных пользователя
+
+    Итоги по транзакциям в журнал не пишутся: они ведутся по разнице при применении записи.
+    """
+    name = entry["collection"]
+    if name == "transactions":
+        change = None if entry["op"] == "replace" else {entry["op"]: entry["records"]}
+        data.update(update_aggregates(data, {"transactions": entry["records"]}, change))
+    if entry["op"] == "replace":
+        records = entry["records"]
+        data[name] = list(records) if isinstance(records, list) else records
+    elif entry["op"] == "added":
+        data.setdefault(name, []).extend(entry["records"])
+    elif entry["op"] == "updated":
+        replace_records(data.setdefault(name, []), entry["records"])
+    elif entry["op"] == "removed":
+        # records — ID удаленных записей
+        remove_records(data.setdefault(name, []), entry["records"])
+
+
+class UserJournal:
+    """Журнал изменений пользователя (JSON Lines, только дозапись)"""
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+
+    def size(self):
+        try:
+            return os.stat(self.path).st_size
+        except OSError:
+            return 0
+
+    def read_from(self, offset):
+        """Записи начиная с offset: (записи, смещение после последней полной строки)"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return [], 0
+
+        # Недописанную последнюю строку оставляем до следующего чтения
+        end = chunk.rfind(b'\n') + 1
+        entries = []
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            if not isinstance(entry, dict) or "seq" not in entry:
+                # Испорченная строка (запись, прерванная сбоем) — пропускаем, а не падаем на каждом чтении
+                print(f" Пропущена испорченная строка журнала {self.path}")
+                continue
+            entries.append(entry)
+        return entries, offset + end
+
+    def append(self, entries):
+        """Дозапись одним вызовом write() (+ fsync по желанию); вызывается под блокировкой пользователя"""
+        payload = b''.join(
+            json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+            for entry in entries
+        )
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            self._drop_partial_line(fd)
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        return len(payload)
+
+    @staticmethod
+    def _drop_partial_line(fd, block=64 * 1024):
+        """Обрезка недописанной последней строки (запись прервана сбоем): иначе новая запись
+        склеится с ней в одну испорченную строку"""
+        size = os.fstat(fd).st_size
+        if not size or os.pread(fd, 1, size - 1) == b'\n':
+            return
+        end = size
+        while end > 0:
+            start = max(0, end - block)
+            newline = os.pread(fd, end - start, start).rfind(b'\n')
+            if newline >= 0:
+                os.ftruncate(fd, start + newline + 1)
+                return
+            end = start
+        os.ftruncate(fd, 0)
+
+    def truncate(self):
+        """Очистка журнала после переноса в снимок"""
+        with open(self.path, 'wb'):
+            pass
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки между процессами недоступны
+    fcntl = None
+
+
+SHARED = fcntl.LOCK_SH if fcntl else 1
+EXCLUSIVE = fcntl.LOCK_EX if fcntl else 2
+
+
+class FileLock:
+    """Блокировка файла между процессами (fcntl.flock на соседнем .lock-файле)
+
+    Читатели берут разделяемую блокировку и работают параллельно,
+    писатель — исключительную. Повторный захват в том же потоке не блокирует.
+    """
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._local = threading.local()
+
+    @contextmanager
+    def _acquire(self, mode):
+        held = getattr(self._local, "mode", None)
+        if held is not None:
+            if held == SHARED and mode == EXCLUSIVE:
+                raise RuntimeError("Нельзя повысить разделяемую блокировку до исключительной")
+            yield
+            return
+
+        fd = None
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, mode)
+            except BaseException:
+                os.close(fd)
+                raise
+
+        self._local.mode = mode
+        try:
+            yield
+        finally:
+            self._local.mode = None
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def shared(self):
+        """Разделяемая блокировка (чтение)"""
+        return self._acquire(SHARED)
+
+    def exclusive(self):
+        """Исключительная блокировка (запись)"""
+        return self._acquire(EXCLUSIVE)
+
+
+def remove_stale_temp_files(directory):
+    """Удаление временных файлов atomic_write, оставшихся от прерванной записи
+
+    Файл пишется под блокировкой целевого файла: если ее удалось взять, временный файл
+    никто уже не допишет. Занятые блокировки пропускаются.
+    """
+    if fcntl is None:
+        return 0  # Без блокировок не отличить брошенный файл от записываемого
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    removed = 0
+    for name in names:
+        if not name.endswith(".tmp") or name.count(".") < 2:
+            continue
+        # <имя целевого файла>.<случайная часть>.tmp
+        target = os.path.join(directory, name.rsplit(".", 2)[0])
+        fd = os.open(FileLock(target).path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        try:
+            os.unlink(os.path.join(directory, name))
+            removed += 1
+        except OSError:
+            pass
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+    if removed:
+        print(f" Удалено временных файлов прерванной записи: {removed} ({directory})")
+    return removed
+
+
+def atomic_write(path, payload):
+    """Запись через временный файл, fsync и os.replace: читатель видит старый или новый файл целиком"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        # Права как у заменяемого файла (mkstemp создает файл с 0600)
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # Фиксируем переименование на диске
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
@@ -0,0 +1,159 @@
+import mmap
+import os
+import time
+
+from modules.locking import atomic_write
+from modules.serialization import dumps_json, loads_json
+
+
+def file_key(stat_result):
+    """Отпечаток файла для сверки индекса с файлом данных"""
+    return [stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns]
+
+
+def encode_indexed(data):
+    """Компактный JSON, в котором известно положение каждого пользователя: (байты, индекс)
+
+    Каждый пользователь — непрерывный фрагмент, который разбирается отдельно.
+    """
+    parts = []
+    index = {"shared": {}, "users": {}}
+    pos = 0
+
+    def emit(chunk):
+        nonlocal pos
+        parts.append(chunk)
+        pos += len(chunk)
+
+    emit(b"{")
+    for key, value in data.items():
+        if key == "users":
+            continue
+        emit(dumps_json(key) + b":")
+        chunk = dumps_json(value)
+        index["shared"][key] = [pos, pos + len(chunk)]
+        emit(chunk + b",")
+
+    emit(b'"users":[')
+    for i, user in enumerate(data.get("users", [])):
+        if i:
+            emit(b",\n")
+        chunk = dumps_json(user)
+        if isinstance(user, dict):
+            index["users"][str(user.get("id"))] = [pos, pos + len(chunk), user.get("username")]
+        emit(chunk)
+    emit(b"]}")
+    return b"".join(parts), index
+
+
+def write_indexed(path, data):
+    """Запись файла данных и индекса пользователей рядом (path + '.idx')"""
+    payload, index = encode_indexed(data)
+    atomic_write(path, payload)
+    index["file"] = file_key(os.stat(path))
+    atomic_write(path + ".idx", dumps_json(index))
+
+
+class OffsetIndex:
+    """Чтение данных одного пользователя из общего файла по индексу смещений"""
+
+    # Только что записанному файлу не доверяем: в пределах одного такта mtime
+    # отпечаток может совпасть у двух записей подряд (как и в CachedFile)
+    RACY_WINDOW_NS = 50_000_000
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        # (отпечаток файла данных, индекс, разобранные фрагменты)
+        self._state = (None, None, {})
+        # Имя пользователя -> ID для индекса из self._state
+        self._usernames = {}
+
+    def invalidate(self):
+        """Сброс разобранных фрагментов (записи из них могли изменить на месте)"""
+        self._state = (None, None, {})
+        self._usernames = {}
+
+    def _load_index(self):
+        """Индекс, соответствующий текущему файлу данных (None, если устарел или его нет)"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None, None, None
+        if time.time_ns() - st.st_mtime_ns < self.RACY_WINDOW_NS:
+            return None, None, None
+        key = file_key(st)
+
+        cached_key, index, slices = self._state
+        if cached_key == key:
+            return key, index, slices
+
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = loads_json(f.read())
+        except (OSError, ValueError):
+            return None, None, None
+        if index.get("file") != key:
+            return None, None, None
+
+        usernames = {}
+        for user_id, position in index["users"].items():
+            usernames.setdefault(position[2], user_id)
+        self._usernames = usernames
+        self._state = (key, index, {})
+        return key, index, self._state[2]
+
+    def _read_slice(self, key, start, end):
+        """Разбор фрагмента файла через mmap (только если файл не подменили)"""
+        try:
+            with open(self.path, 'rb') as f:
+                if file_key(os.fstat(f.fileno())) != key:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return loads_json(mm[start:end])
+        except (OSError, ValueError):
+            return None
+
+    def _cached_slice(self, key, slices, name, start, end):
+        if name not in slices:
+            value = self._read_slice(key, start, end)
+            if value is None:
+                raise LookupError(name)
+            slices[name] = value
+        return slices[name]
+
+    def get_user(self, user_id):
+        """(найден ли индекс, пользователь или None)"""
+        key, index, slices = self._load_index()
+        if index is None:
+            return False, None
+        position = index["users"].get(str(user_id))
+        if position is None:
+            return True, None
+        try:
+            return True, self._cached_slice(key, slices, ("user", str(user_id)), position[0], position[1])
+        except LookupError:
+            return False, None
+
+    def find_user(self, username):
+        """(найден ли индекс, пользователь или None)"""
+        key, index, _ = self._load_index()
+        if index is None:
+            return False, None
+        user_id = self._usernames.get(username)
+        if user_id is None:
+            return True, None
+        return self.get_user(user_id)
+
+    def load_shared(self):
+        """Общие справочники (None, если индекс недоступен)"""
+        key, index, slices = self._load_index()
+        if index is None:
+            return None
+        try:
+            return {
+                name: self._cached_slice(key, slices, ("shared", name), start, end)
+                for name, (start, end) in index["shared"].items()
+            }
+        except LookupError:
+            return None
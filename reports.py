@@ -0,0 +1,95 @@
+from datetime import date
+
+from modules.aggregates import AGGREGATES, compute_aggregates, month_window, top_categories
+from modules.utils import get_investment_summary
+
+
+def monthly_summary(monthly, months=6, start=None, end=None):
+    """Сводка по месяцам из свода user_data["monthly"] (формат get_monthly_summary)
+
+    Стоит O(месяцев в своде), без перебора транзакций; start/end — окно 'ГГГГ-ММ'.
+    """
+    result = {}
+    for month_key in month_window(monthly, start, end, months):
+        income, expense, balance, count = monthly[month_key]
+        year, month = map(int, month_key.split('-'))
+        result[month_key] = {
+            "name": date(year, month, 1).strftime('%B %Y'),
+            "income": income,
+            "expense": expense,
+            "balance": balance,
+            "transactions": count
+        }
+    return result
+
+
+def category_summary(by_category, trans_type="expense", limit=8):
+    """Топ категорий из свода user_data["by_category"] (формат get_category_summary)
+
+    Стоит O(категорий): топ выбирается кучей, транзакции не перебираются.
+    """
+    categories = by_category.get(trans_type, {})
+    total = sum(amount for amount, _ in categories.values())
+    return {
+        category: {
+            "amount": amount,
+            "count": count,
+            "percentage": (amount / total * 100) if total > 0 else 0
+        }
+        for category, (amount, count) in top_categories(categories, limit)
+    }
+
+
+class Report:
+    """Данные страницы отчетов
+
+    Транзакции берутся из сводов хранилища (totals, monthly, by_category) без перебора;
+    инвестиции и цели проходятся по одному разу.
+    """
+
+    def __init__(self):
+        self.transactions_count = 0
+        self.total_income = 0.0
+        self.total_expense = 0.0
+        self.total_balance = 0.0
+        self.monthly = {}
+        self.expense_categories = {}
+        self.income_categories = {}
+        self.investments_count = 0
+        self.investment_summary = {}
+        self.goals_count = 0
+        self.goals_target = 0.0
+        self.goals_saved = 0.0
+        self.goals_progress = 0.0
+
+
+def build_report(user_data, months=6, top=8):
+    """Отчет пользователя: по одному проходу на коллекцию, транзакции — из сводов"""
+    report = Report()
+    transactions = user_data.get("transactions", [])
+    aggregates = {name: user_data.get(name) for name in AGGREGATES}
+    if any(value is None for value in aggregates.values()):
+        # Данные без сводов: все сразу за один проход по транзакциям
+        aggregates = compute_aggregates(transactions)
+
+    totals = aggregates["totals"]
+    report.transactions_count = len(transactions)
+    report.total_income = totals["positive"]
+    report.total_expense = totals["negative"]
+    report.total_balance = report.total_income - report.total_expense
+    report.monthly = monthly_summary(aggregates["monthly"], months)
+    report.expense_categories = category_summary(aggregates["by_category"], "expense", top)
+    report.income_categories = category_summary(aggregates["by_category"], "income", top)
+
+    investments = user_data.get("investments", [])
+    report.investments_count = len(investments)
+    report.investment_summary = get_investment_summary(investments)
+
+    for goal in user_data.get("goals", []):
+        if isinstance(goal, dict):
+            report.goals_count += 1
+            report.goals_target += goal.get("target", 0)
+            report.goals_saved += goal.get("saved", 0)
+    if report.goals_target > 0:
+        report.goals_progress = report.goals_saved / report.goals_target * 100
+    return report
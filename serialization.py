@@ -0,0 +1,111 @@
+import json
+import marshal
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Заголовок двоичных форматов: MAGIC + имя кодека + перевод строки.
+# Файлы без заголовка — обычный JSON (в том числе старый формат с отступами).
+MAGIC = b"FDB1:"
+ZLIB_SUFFIX = "+zlib"
+DEFAULT_CODEC = "json"
+
+
+def loads_json(raw):
+    """Разбор JSON (orjson, если установлен)"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8-sig'))
+
+
+def dumps_json(data):
+    """Компактный JSON в UTF-8"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _json_pretty_dumps(data):
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data)
+
+
+def _msgpack_dumps(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _msgpack_loads(raw):
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+# Кодеки: имя -> (кодирование, декодирование, пишется ли заголовок)
+CODECS = {
+    # Прежний формат: JSON с отступами
+    "json-pretty": (_json_pretty_dumps, loads_json, False),
+    # Компактный JSON без отступов
+    "json": (dumps_json, loads_json, False),
+    # marshal из стандартной библиотеки: быстрый, но привязан к версии Python
+    "marshal": (marshal.dumps, marshal.loads, True),
+}
+if orjson is not None:
+    CODECS["orjson"] = (_orjson_dumps, loads_json, False)
+if msgpack is not None:
+    CODECS["msgpack"] = (_msgpack_dumps, _msgpack_loads, True)
+
+
+def available_codecs():
+    """Доступные кодеки, включая варианты со сжатием zlib"""
+    names = list(CODECS)
+    return names + [name + ZLIB_SUFFIX for name in names]
+
+
+def _split_name(name):
+    """Имя кодека -> (базовый кодек, сжатие)"""
+    compressed = name.endswith(ZLIB_SUFFIX)
+    base = name[:-len(ZLIB_SUFFIX)] if compressed else name
+    if base not in CODECS:
+        raise ValueError(f"Неизвестный или недоступный кодек: {name}")
+    return base, compressed
+
+
+def encode(data, codec=DEFAULT_CODEC):
+    """Сериализация данных выбранным кодеком"""
+    base, compressed = _split_name(codec)
+    dumps, _, with_header = CODECS[base]
+    payload = dumps(data)
+    if compressed:
+        payload = zlib.compress(payload, 6)
+    if compressed or with_header:
+        return MAGIC + codec.encode('ascii') + b"\n" + payload
+    return payload
+
+
+def detect_codec(raw):
+    """Кодек по заголовку файла (без заголовка — JSON)"""
+    if raw.startswith(MAGIC):
+        end = raw.index(b"\n")
+        return raw[len(MAGIC):end].decode('ascii')
+    return "json"
+
+
+def decode(raw):
+    """Десериализация с автоопределением кодека по заголовку"""
+    if not raw.startswith(MAGIC):
+        return loads_json(raw)
+
+    end = raw.index(b"\n")
+    base, compressed = _split_name(raw[len(MAGIC):end].decode('ascii'))
+    payload = raw[end + 1:]
+    if compressed:
+        payload = zlib.decompress(payload)
+    return CODECS[base][1](payload)
@@ -0,0 +1,315 @@
+import os
+import threading
+from functools import partial
+
+from modules.aggregates import AGGREGATES
+from modules.journal import UserJournal, apply_journal_entry, journal_entries
+from modules.locking import remove_stale_temp_files
+from modules.storage import (
+    BaseStore, CachedFile, JsonStore, SHARED_KEYS, USER_COLLECTIONS, USER_STATE_KEYS,
+    apply_user_changes, build_user_data, continue_versions, create_default_data, ensure_required_keys,
+    UserIndex, meta_updates, migrate_store, normalize_changes, read_file, write_file
+)
+from modules.serialization import DEFAULT_CODEC
+
+
+class ShardedJsonStore(BaseStore):
+    """Хранилище по файлу на пользователя
+
+    data/shared.json      — справочники и индекс пользователей (без личных данных)
+    data/users/<id>.json  — транзакции, инвестиции, цели и служебные поля одного пользователя
+
+    С journal=True изменения дописываются в data/users/<id>.journal.jsonl,
+    а файл пользователя служит снимком, в который журнал периодически сворачивается.
+    """
+
+    # Размер журнала, после которого он сворачивается в снимок
+    COMPACT_THRESHOLD = 256 * 1024
+
+    def __init__(self, root, journal=False, fsync=False, compact_threshold=COMPACT_THRESHOLD,
+                 codec=DEFAULT_CODEC):
+        self.root = root
+        self.users_dir = os.path.join(root, "users")
+        self._write = partial(write_file, codec=codec)
+        self._shared = CachedFile(os.path.join(root, "shared.json"), self._read_shared, self._write)
+        self._shards = {}
+        self._users = UserIndex()
+        self.journal = journal
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        # Состояние пользователя с примененным журналом: user_id -> dict
+        self._states = {}
+        self._compacting = set()
+        # Временные файлы записи, прерванной завершением процесса
+        remove_stale_temp_files(self.root)
+        remove_stale_temp_files(self.users_dir)
+
+    # ФАЙЛЫ
+    @staticmethod
+    def _read_shared(path):
+        shared = read_file(path)
+        if not isinstance(shared, dict):
+            # Нет общего файла — начинаем со структуры по умолчанию
+            shared = create_default_data()
+            for user in shared["users"]:
+                for collection in USER_COLLECTIONS:
+                    user.pop(collection, None)
+        return ensure_required_keys(shared)
+
+    @staticmethod
+    def _read_shard(path):
+        shard = read_file(path)
+        return shard if isinstance(shard, dict) else {}
+
+    def _shard(self, user_id):
+        """Файл пользователя"""
+        shard = self._shards.get(user_id)
+        if shard is None:
+            os.makedirs(self.users_dir, exist_ok=True)
+            path = os.path.join(self.users_dir, f"{int(user_id)}.json")
+            shard = self._shards[user_id] = CachedFile(path, self._read_shard, self._write)
+        return shard
+
+    def _save_shared(self, shared):
+        os.makedirs(self.root, exist_ok=True)
+        self._shared.save(shared)
+
+    def _shared_lock(self):
+        """Блокировка записи общего файла (между процессами)"""
+        return self._shared.lock.exclusive()
+
+    def initialize(self):
+        if not os.path.exists(self._shared.path):
+            print(" Создаем файлы данных...")
+            self.save_data(create_default_data())
+
+    def invalidate(self):
+        self._shared.invalidate()
+        for shard in self._shards.values():
+            shard.invalidate()
+        self._states.clear()
+
+    # ЖУРНАЛ
+    def _user_lock(self, user_id):
+        """Блокировка записи данных пользователя (между процессами)"""
+        return self._shard(user_id).lock.exclusive()
+
+    def _journal(self, user_id):
+        return UserJournal(os.path.join(self.users_dir, f"{int(user_id)}.journal.jsonl"), self.fsync)
+
+    def _load_state(self, user_id):
+        """Снимок пользователя + новые записи журнала (читаются только дописанные байты)"""
+        shard = self._shard(user_id)
+        journal = self._journal(user_id)
+        while True:
+            snapshot_key = shard.key()
+            state = self._states.get(user_id)
+            if state is None or state["snapshot_key"] != snapshot_key or journal.size() < state["offset"]:
+                snapshot = self._read_shard(shard.path)
+                state = {
+                    "snapshot_key": snapshot_key,
+                    "offset": 0,
+                    "seq": snapshot.pop("journal_seq", 0),
+                    "data": snapshot,
+                }
+
+            entries, offset = journal.read_from(state["offset"])
+            # Снимок переписан во время чтения журнала — читаем заново
+            if shard.key() != snapshot_key:
+                continue
+
+            # Записи, уже свернутые в снимок, пропускаем по номеру
+            for entry in entries:
+                if entry["seq"] > state["seq"]:
+                    apply_journal_entry(state["data"], entry)
+                    state["seq"] = entry["seq"]
+            state["offset"] = offset
+            self._states[user_id] = state
+            return state
+
+    def _user_collections(self, user_id):
+        """Коллекции пользователя (с учетом журнала)"""
+        if self.journal:
+            return self._load_state(user_id)["data"]
+        return self._shard(user_id).load()
+
+    def _append_journal(self, user_id, user_data, changes):
+        """Дозапись изменений в журнал пользователя"""
+        journal = self._journal(user_id)
+        with self._user_lock(user_id):
+            state = self._load_state(user_id)
+            updates = meta_updates(state["data"], user_data, changes)
+            # Итоги не пишем: при чтении журнала они пересчитываются по разнице (apply_journal_entry),
+            # иначе каждая дозапись весила бы как вся история по месяцам и категориям
+            # (кроме первой записи итогов для данных, где их еще не было)
+            scalars = [
+                name for name in updates
+                if name not in AGGREGATES or not isinstance(state["data"].get(name), dict)
+            ]
+            entries = journal_entries(
+                {**changes, **dict.fromkeys(scalars)}, {**user_data, **updates}, state["seq"]
+            )
+            if not entries:
+                return
+            journal.append(entries)
+            self._load_state(user_id)
+
+        if journal.size() > self.compact_threshold:
+            self._schedule_compaction(user_id)
+
+    def _schedule_compaction(self, user_id):
+        """Свертка журнала в фоновом потоке"""
+        if user_id in self._compacting:
+            return
+        self._compacting.add(user_id)
+        # Не daemon: при выходе процесса интерпретатор дождется свертки, а не прервет запись снимка
+        threading.Thread(target=self._compact_in_background, args=(user_id,)).start()
+
+    def _compact_in_background(self, user_id):
+        try:
+            self.compact(user_id)
+        except Exception as e:
+            print(f" Ошибка при свертке журнала пользователя {user_id}: {e}")
+        finally:
+            self._compacting.discard(user_id)
+
+    def compact(self, user_id):
+        """Перенос журнала в снимок пользователя"""
+        with self._user_lock(user_id):
+            self._write_snapshot(user_id, self._load_state(user_id)["data"])
+
+    def _write_snapshot(self, user_id, collections):
+        """Запись снимка (вызывается под блокировкой пользователя)"""
+        shard = self._shard(user_id)
+        if not self.journal:
+            shard.save(collections)
+            return
+
+        journal = self._journal(user_id)
+        # Номер последней записи журнала, вошедшей в снимок
+        seq = self._load_state(user_id)["seq"]
+        snapshot = {**collections, "journal_seq": seq}
+        shard.save(snapshot)
+        journal.truncate()
+        self._states[user_id] = {
+            "snapshot_key": shard.key(),
+            "offset": 0,
+            "seq": seq,
+            "data": {name: snapshot[name] for name in collections},
+        }
+
+    # ВСЕ ДАННЫЕ (сброс, миграция)
+    def load_data(self):
+        shared = self._shared.load()
+        data = {key: shared.get(key) for key in SHARED_KEYS}
+        data["users"] = []
+        for user in shared.get("users", []):
+            shard = self._user_collections(user["id"])
+            data["users"].append({
+                **user,
+                **{collection: shard.get(collection, []) for collection in USER_COLLECTIONS},
+                **{name: shard[name] for name in USER_STATE_KEYS if name in shard}
+            })
+        return data
+
+    def save_data(self, data):
+        if not isinstance(data, dict):
+            print(" Ошибка")
+            return False
+        ensure_required_keys(data)
+        try:
+            users = []
+            for user in data.get("users", []):
+                with self._user_lock(user["id"]):
+                    self._write_snapshot(user["id"], self._split_user(self._continue_version(user)))
+                users.append({
+                    k: v for k, v in user.items() if k not in USER_COLLECTIONS and k not in USER_STATE_KEYS
+                })
+            with self._shared_lock():
+                self._save_shared({**{key: data.get(key) for key in SHARED_KEYS}, "users": users})
+            return True
+        except Exception as e:
+            print(f" Ошибка при сохранении данных: {e}")
+            return False
+
+    def _continue_version(self, user):
+        """Версия для перезаписи файла пользователя — после сохраненной в нем (или в журнале)"""
+        stored = self._user_collections(user["id"])
+        continue_versions([{"id": user["id"], "version": stored.get("version", 0)}], [user])
+        return user
+
+    @staticmethod
+    def _split_user(user):
+        """Содержимое файла пользователя: коллекции и служебные поля"""
+        shard = {collection: user.get(collection, []) for collection in USER_COLLECTIONS}
+        shard.update({name: user[name] for name in USER_STATE_KEYS if name in user})
+        return shard
+
+    # ПОЛЬЗОВАТЕЛИ
+    def get_user(self, user_id):
+        return self._users.get(self._shared.load(), user_id)
+
+    def find_user(self, username):
+        return self._users.find(self._shared.load(), username)
+
+    def create_user(self, user):
+        with self._shared_lock():
+            return self._create_user(user)
+
+    def _create_user(self, user):
+        shared = self._shared.load()
+        if self._users.find(shared, user["username"]):
+            return None
+
+        user = dict(user)
+        user["id"] = self._users.next_id(shared)
+        with self._user_lock(user["id"]):
+            # Файл мог остаться от удаленного при сбросе пользователя с тем же ID
+            self._write_snapshot(user["id"], self._split_user(self._continue_version(user)))
+            for name in USER_COLLECTIONS + USER_STATE_KEYS:
+                user.pop(name, None)
+        self._users.add(shared, user)
+        self._save_shared(shared)
+        return user
+
+    def load_user_data(self, user_id):
+        user = self.get_user(user_id)
+        if user is None:
+            return None
+        user = {**user, **self._user_collections(user_id)}
+        return self._keep_aggregates(user_id, user, build_user_data(user, self._shared.load()))
+
+    def save_user_data(self, user_id, user_data, changes=None):
+        user = self.get_user(user_id)
+        if user is None:
+            return False
+
+        changes = normalize_changes(user_data, changes)
+        try:
+            collections = {name: change for name, change in changes.items() if name != "user_info"}
+            if collections and self.journal:
+                # Изменение — одна дозапись в журнал, без перезаписи файла
+                self._append_journal(user_id, user_data, collections)
+            elif collections:
+                shard = self._shard(user_id)
+                with self._user_lock(user_id):
+                    data = shard.load()
+                    apply_user_changes(data, user_data, collections)
+                    shard.save(data)
+
+            # Общий файл пишем, только если изменился профиль риска
+            risk_profile = user_data.get("user_info", {}).get("risk_profile", 2)
+            if "user_info" in changes and user.get("risk_profile") != risk_profile:
+                with self._shared_lock():
+                    shared = self._shared.load()
+                    self._users.get(shared, user_id)["risk_profile"] = risk_profile
+                    self._save_shared(shared)
+            return True
+        except Exception as e:
+            print(f" Ошибка при сохранении данных: {e}")
+            return False
+
+
+def migrate_json_to_shards(json_path, data_dir):
+    """Разбиение общего JSON-файла на файлы пользователей"""
+    return migrate_store(JsonStore(json_path), ShardedJsonStore(data_dir))
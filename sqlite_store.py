@@ -0,0 +1,311 @@
+import json
+import sqlite3
+import threading
+
+from modules.storage import (
+    BaseStore, JsonStore, SHARED_KEYS, USER_COLLECTIONS, USER_META,
+    build_user_data, create_default_data, ensure_required_keys, meta_updates, migrate_store,
+    continue_versions, normalize_changes, renumber_duplicates
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    password_hash TEXT,
+    email TEXT,
+    created_at TEXT,
+    risk_profile INTEGER DEFAULT 2,
+    data TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    user_id INTEGER NOT NULL,
+    id INTEGER,
+    date TEXT,
+    type TEXT,
+    category TEXT,
+    amount REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions(user_id, category);
+
+CREATE TABLE IF NOT EXISTS investments (
+    user_id INTEGER NOT NULL,
+    id INTEGER,
+    type TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS goals (
+    user_id INTEGER NOT NULL,
+    id INTEGER,
+    data TEXT NOT NULL
+);
+"""
+
+# Уникальные индексы (user_id, id): поиск записи по ID при изменении и удалении без
+# перебора всех записей пользователя; заодно база не примет двух записей с одним ID.
+# Создаются отдельно от SCHEMA: в старой базе могут уже быть повторы
+UNIQUE_INDEXES = {
+    collection: f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{collection}_user_id ON {collection}(user_id, id)"
+    for collection in ("transactions", "investments", "goals")
+}
+
+# Поля пользователя, хранящиеся в отдельных колонках (остальные, включая
+# служебные счетчики и версию, — в JSON-колонке data)
+USER_COLUMNS = ("id", "username", "password_hash", "email", "created_at", "risk_profile")
+
+# Колонки коллекций помимо user_id и data (запись целиком хранится в data)
+COLLECTION_COLUMNS = {
+    "transactions": ("id", "date", "type", "category", "amount"),
+    "investments": ("id", "type"),
+    "goals": ("id",),
+}
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class SqliteStore(BaseStore):
+    """Хранилище в базе SQLite: одна запись — одна строка"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        """Соединение текущего потока"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL: читатели не блокируют писателя (несколько воркеров gunicorn)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            self._init_schema(conn)
+        return conn
+
+    def _init_schema(self, conn):
+        """Создание таблиц и начальных данных"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            with conn:
+                conn.executescript(SCHEMA)
+            for collection, statement in UNIQUE_INDEXES.items():
+                try:
+                    with conn:
+                        conn.execute(statement)
+                except sqlite3.IntegrityError:
+                    print(f"⚠️ В таблице {collection} есть записи с одинаковыми ID, уникальный индекс не создан")
+            if conn.execute("SELECT COUNT(*) FROM settings").fetchone()[0] == 0:
+                print(" База данных пустая, создаем структуру по умолчанию")
+                self._write_all(conn, create_default_data())
+            self._initialized = True
+
+    def initialize(self):
+        self._connect()
+
+    # ОБЩИЕ ДАННЫЕ
+    def _load_shared(self, conn):
+        rows = conn.execute("SELECT key, value FROM settings").fetchall()
+        return {row["key"]: json.loads(row["value"]) for row in rows}
+
+    def _row_to_user(self, row):
+        user = json.loads(row["data"]) if row["data"] else {}
+        for column in USER_COLUMNS:
+            user[column] = row[column]
+        return user
+
+    def _user_row(self, user):
+        extra = {
+            key: value for key, value in user.items()
+            if key not in USER_COLUMNS and key not in USER_COLLECTIONS
+        }
+        return tuple(user.get(column) for column in USER_COLUMNS) + (_dumps(extra),)
+
+    def _insert_records(self, conn, user_id, collection, records):
+        columns = COLLECTION_COLUMNS[collection]
+        placeholders = ", ".join("?" * (len(columns) + 2))
+        conn.executemany(
+            f"INSERT INTO {collection} (user_id, {', '.join(columns)}, data) VALUES ({placeholders})",
+            [
+                (user_id,) + tuple(record.get(column) for column in columns) + (_dumps(record),)
+                for record in records if isinstance(record, dict)
+            ]
+        )
+
+    def _update_records(self, conn, user_id, collection, records):
+        columns = COLLECTION_COLUMNS[collection]
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        conn.executemany(
+            f"UPDATE {collection} SET {assignments}, data = ? WHERE user_id = ? AND id = ?",
+            [
+                tuple(record.get(column) for column in columns) + (_dumps(record), user_id, record.get("id"))
+                for record in records if isinstance(record, dict)
+            ]
+        )
+
+    def _load_records(self, conn, user_id, collection, ids=None):
+        """Записи коллекции пользователя (ids — только с этими ID)"""
+        if ids is None:
+            rows = conn.execute(
+                f"SELECT data FROM {collection} WHERE user_id = ? ORDER BY rowid", (user_id,)
+            )
+            return [json.loads(row[0]) for row in rows]
+
+        ids = list(ids)
+        records = []
+        # Порциями: число параметров запроса ограничено
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT data FROM {collection} WHERE user_id = ? AND id IN ({', '.join('?' * len(chunk))})",
+                (user_id, *chunk)
+            )
+            records.extend(json.loads(row[0]) for row in rows)
+        return records
+
+    def _write_all(self, conn, data):
+        """Полная перезапись содержимого базы (внутри транзакции)"""
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stored = [
+                {"id": row["id"], **(json.loads(row["data"]) if row["data"] else {})}
+                for row in conn.execute("SELECT id, data FROM users")
+            ]
+            continue_versions(stored, data.get("users", []))
+            for table in ("settings", "users") + USER_COLLECTIONS:
+                conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                "INSERT INTO settings (key, value) VALUES (?, ?)",
+                [(key, _dumps(data.get(key))) for key in SHARED_KEYS]
+            )
+            for user in data.get("users", []):
+                for collection in USER_COLLECTIONS:
+                    renumber_duplicates(user, collection)
+                conn.execute(
+                    f"INSERT INTO users ({', '.join(USER_COLUMNS)}, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self._user_row(user)
+                )
+                for collection in USER_COLLECTIONS:
+                    self._insert_records(conn, user.get("id"), collection, user.get(collection, []))
+
+    def load_data(self):
+        conn = self._connect()
+        data = {"users": []}
+        for row in conn.execute("SELECT * FROM users ORDER BY id").fetchall():
+            user = self._row_to_user(row)
+            for collection in USER_COLLECTIONS:
+                user[collection] = self._load_records(conn, user["id"], collection)
+            data["users"].append(user)
+        data.update(self._load_shared(conn))
+        return data
+
+    def save_data(self, data):
+        if not isinstance(data, dict):
+            print(" Ошибка")
+            return False
+        try:
+            self._write_all(self._connect(), ensure_required_keys(data))
+            return True
+        except sqlite3.Error as e:
+            print(f" Ошибка при сохранении данных: {e}")
+            return False
+
+    # ПОЛЬЗОВАТЕЛИ
+    def get_user(self, user_id):
+        row = self._connect().execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return self._row_to_user(row) if row else None
+
+    def find_user(self, username):
+        row = self._connect().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return self._row_to_user(row) if row else None
+
+    def create_user(self, user):
+        conn = self._connect()
+        user = dict(user)
+        user["id"] = None  # ID назначает база
+        try:
+            with conn:
+                cursor = conn.execute(
+                    f"INSERT INTO users ({', '.join(USER_COLUMNS)}, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self._user_row(user)
+                )
+        except sqlite3.IntegrityError:
+            return None  # Имя пользователя занято
+        user["id"] = cursor.lastrowid
+        return user
+
+    def load_user_data(self, user_id):
+        conn = self._connect()
+        user = self.get_user(user_id)
+        if user is None:
+            return None
+        for collection in USER_COLLECTIONS:
+            user[collection] = self._load_records(conn, user_id, collection)
+        return self._keep_aggregates(user_id, user, build_user_data(user, self._load_shared(conn)))
+
+    def save_user_data(self, user_id, user_data, changes=None):
+        conn = self._connect()
+        changes = normalize_changes(user_data, changes)
+        try:
+            with conn:
+                # Блокировка записи — до чтения счетчиков и итогов: иначе неявный BEGIN
+                # случится только на первой записи, и два воркера выдадут одинаковые ID
+                # и применят свои изменения итогов к одному и тому же старому значению
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+                if row is None:
+                    return False
+                # До вставки записей: перенумерованные записи вставляются уже с новыми ID
+                extra = json.loads(row["data"]) if row["data"] else {}
+                updates = meta_updates(
+                    extra, user_data, changes, lambda ids: self._load_records(conn, user_id, "transactions", ids)
+                )
+                if updates:
+                    extra.update(updates)
+                    conn.execute("UPDATE users SET data = ? WHERE id = ?", (_dumps(extra), user_id))
+
+                for name, change in changes.items():
+                    if name in USER_META:
+                        continue
+                    if name == "user_info":
+                        conn.execute(
+                            "UPDATE users SET risk_profile = ? WHERE id = ?",
+                            (user_data["user_info"].get("risk_profile", 2), user_id)
+                        )
+                    elif change is None:
+                        conn.execute(f"DELETE FROM {name} WHERE user_id = ?", (user_id,))
+                        self._insert_records(conn, user_id, name, user_data[name])
+                    else:
+                        # Добавление записи — одна вставка строки
+                        self._insert_records(conn, user_id, name, change.get("added", []))
+                        self._update_records(conn, user_id, name, change.get("updated", []))
+                        # Удаление — по ID, без перезаписи коллекции
+                        conn.executemany(
+                            f"DELETE FROM {name} WHERE user_id = ? AND id = ?",
+                            [(user_id, record_id) for record_id in change.get("removed", [])]
+                        )
+            return True
+        except sqlite3.Error as e:
+            print(f" Ошибка при сохранении данных: {e}")
+            return False
+
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """Перенос данных из JSON-файла в базу SQLite (база перезаписывается)"""
+    return migrate_store(JsonStore(json_path), SqliteStore(db_path))
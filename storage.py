@@ -0,0 +1,663 @@
+import os
+import time
+from functools import partial
+
+from modules.aggregates import AGGREGATES, compute_aggregates, update_aggregates
+from modules.locking import FileLock, atomic_write
+from modules.offset_index import OffsetIndex, write_indexed
+from modules.serialization import DEFAULT_CODEC, decode, encode
+
+
+# Личные коллекции пользователя и общие для всех справочники
+USER_COLLECTIONS = ("transactions", "investments", "goals")
+SHARED_KEYS = ("categories", "investment_types", "risk_profiles")
+REQUIRED_KEYS = ("users",) + SHARED_KEYS
+# Служебные данные пользователя — словари, которые сохраняются целиком:
+# counters — последние выданные ID записей по коллекциям
+USER_META = ("counters",)
+# Служебные поля, которые хранятся рядом с коллекциями пользователя и которые ведет
+# само хранилище: version — номер версии данных (растет при каждом изменении коллекций),
+# итоги по транзакциям (см. aggregates.py)
+USER_STATE_KEYS = USER_META + ("version",) + tuple(AGGREGATES)
+# Виды изменений коллекции в описании изменений (см. normalize_changes)
+CHANGE_KINDS = ("added", "updated", "removed")
+
+
+def create_default_data():
+    """Создание структуры данных по умолчанию с пользователями"""
+    return {
+        "users": [
+            {
+                "id": 1,
+                "username": "demo",
+                # Пароль "demo123" в хешированном виде
+                "password_hash": "6ca13d52ca70c883e0f0bb101e425a89e8624de51db2d2392593af6a84118090",
+                "email": "demo@example.com",
+                "created_at": "2024-01-01",
+                "risk_profile": 2,  # умеренный профиль риска
+                "transactions": [],  # Личные транзакции пользователя
+                "investments": [],   # Личные инвестиции
+                "goals": [],         # Личные цели
+                **compute_aggregates([])  # Итоги по транзакциям (см. aggregates.py)
+            }
+        ],
+        # ОБЩИЕ ДАННЫЕ:
+        "categories": {
+            "income": ["Зарплата", "Подработка", "Дивиденды", "Подарок", "Другое"],
+            "expense": ["Еда", "Транспорт", "Аренда", "Развлечения", "Коммуналка", "Другое"]
+        },
+        "investment_types": ["Акции", "Облигации", "Депозиты", "Недвижимость", "ETF", "Криптовалюта"],
+        "risk_profiles": [
+            {"id": 1, "name": "Консервативный", "description": "Минимальный риск, стабильный доход", "stocks_ratio": 20, "bonds_ratio": 60, "cash_ratio": 20},
+            {"id": 2, "name": "Умеренный", "description": "Баланс риска и доходности", "stocks_ratio": 50, "bonds_ratio": 40, "cash_ratio": 10},
+            {"id": 3, "name": "Агрессивный", "description": "Высокий риск, потенциально высокая доходность", "stocks_ratio": 80, "bonds_ratio": 15, "cash_ratio": 5}
+        ]
+    }
+
+
+def ensure_required_keys(data):
+    """Гарантируем наличие обязательных ключей"""
+    for key in REQUIRED_KEYS:
+        if key not in data:
+            print(f"В данных отсутствует ключ '{key}', создаем...")
+            default_data = create_default_data()
+            data[key] = default_data.get(key)
+    return data
+
+
+def has_stored_aggregates(user):
+    """Сохранены ли у пользователя итоги по транзакциям (в данных до их появления — нет)"""
+    return all(isinstance(user.get(name), dict) for name in AGGREGATES)
+
+
+def build_user_data(user, shared):
+    """Данные пользователя + общие настройки (формат load_user_data)"""
+    if has_stored_aggregates(user):
+        aggregates = {name: user[name] for name in AGGREGATES}
+    else:
+        # Итоги еще не сохранены (данные до их появления) — считаем на лету
+        # (хранилище сохранит их сразу после загрузки, см. BaseStore._keep_aggregates)
+        aggregates = compute_aggregates(user.get("transactions", []))
+    return {
+        # Личные данные пользователя:
+        "transactions": list(user.get("transactions", [])),
+        "investments": list(user.get("investments", [])),
+        "goals": list(user.get("goals", [])),
+        "counters": dict(user.get("counters") or {}),
+        "version": user.get("version", 0),
+        # Итоги по транзакциям (ведет хранилище):
+        **aggregates,
+        # Общие данные (для всех одинаковые):
+        "categories": shared.get("categories", {}),
+        "investment_types": shared.get("investment_types", []),
+        "risk_profiles": shared.get("risk_profiles", []),
+        # Информация о пользователе:
+        "user_info": {
+            "id": user.get("id"),
+            "username": user.get("username"),
+            "email": user.get("email"),
+            "risk_profile": user.get("risk_profile", 2)
+        }
+    }
+
+
+class UserIndex:
+    """Индексы пользователей по ID и по имени поверх списка data["users"]
+
+    Строится при первом обращении к загруженным данным и перестраивается,
+    только если список пользователей заменили или изменилось число записей.
+    """
+
+    def __init__(self):
+        self._users = None
+        self._count = 0
+        self.by_id = {}
+        self.by_username = {}
+        self.max_id = 0
+
+    def _sync(self, data):
+        users = data.get("users", [])
+        if users is self._users and len(users) == self._count:
+            return
+        by_id, by_username, max_id = {}, {}, 0
+        for user in users:
+            if not isinstance(user, dict):
+                continue
+            # Как и при переборе списка, выигрывает первая запись
+            by_id.setdefault(user.get("id"), user)
+            by_username.setdefault(user.get("username"), user)
+            if isinstance(user.get("id"), int):
+                max_id = max(max_id, user["id"])
+        self.by_id, self.by_username, self.max_id = by_id, by_username, max_id
+        self._users, self._count = users, len(users)
+
+    def get(self, data, user_id):
+        """Пользователь по ID (None, если не найден)"""
+        self._sync(data)
+        return self.by_id.get(user_id)
+
+    def find(self, data, username):
+        """Пользователь по имени (None, если не найден)"""
+        self._sync(data)
+        return self.by_username.get(username)
+
+    def next_id(self, data):
+        """ID для нового пользователя"""
+        self._sync(data)
+        return self.max_id + 1
+
+    def add(self, data, user):
+        """Добавление пользователя в список и в индексы"""
+        self._sync(data)
+        data["users"].append(user)
+        self.by_id.setdefault(user.get("id"), user)
+        self.by_username.setdefault(user.get("username"), user)
+        if isinstance(user.get("id"), int):
+            self.max_id = max(self.max_id, user["id"])
+        self._count = len(data["users"])
+
+
+def allocate_id(user_data, collection):
+    """ID новой записи коллекции: счетчик только растет, ID удаленных записей не переиспользуются"""
+    counters = user_data.get("counters")
+    if counters is None:
+        counters = user_data["counters"] = {}
+    if collection not in counters:
+        # Данные без счетчиков: продолжаем с наибольшего ID
+        counters[collection] = max(
+            (record["id"] for record in user_data.get(collection, [])
+             if isinstance(record, dict) and isinstance(record.get("id"), int)),
+            default=0
+        )
+    counters[collection] += 1
+    return counters[collection]
+
+
+def renumber_duplicates(user, collection):
+    """Новые ID записям с повторяющимся ID (в данных до счетчиков: len() + 1 после удаления)"""
+    records = [record for record in user.get(collection, []) if isinstance(record, dict)]
+    taken = {record.get("id") for record in records}
+    seen = set()
+    renumbered = 0
+    for record in records:
+        if not isinstance(record.get("id"), int):
+            continue
+        if record["id"] in seen:
+            new_id = allocate_id(user, collection)
+            while new_id in taken:
+                new_id = allocate_id(user, collection)
+            record["id"] = new_id
+            taken.add(new_id)
+            renumbered += 1
+        seen.add(record["id"])
+    return renumbered
+
+
+def reconcile_counters(stored, user_data, changes):
+    """Счетчики для сохранения с учетом уже сохраненных (stored)
+
+    Если параллельный запрос успел выдать те же ID, добавленные записи
+    перенумеровываются после сохраненного счетчика.
+    """
+    counters = dict(user_data.get("counters") or {})
+    for name, value in (stored or {}).items():
+        change = changes.get(name)
+        added = [record for record in (change or {}).get("added", []) if isinstance(record, dict)]
+        if any(isinstance(record.get("id"), int) and record["id"] <= value for record in added):
+            for record in added:
+                value += 1
+                record["id"] = value
+            counters[name] = value
+        else:
+            counters[name] = max(value, counters.get(name, 0))
+    return counters
+
+
+def meta_updates(stored, user_data, changes, load_records=None):
+    """Служебные поля пользователя после сохранения изменений (stored — сохраненные ранее)
+
+    load_records — сохраненные транзакции по ID, если их нет в stored (см. update_aggregates).
+    """
+    updates = {}
+    if "counters" in changes:
+        updates["counters"] = reconcile_counters(stored.get("counters"), user_data, changes)
+    if "transactions" in changes:
+        updates.update(update_aggregates(stored, user_data, changes["transactions"], load_records))
+    if any(name in USER_COLLECTIONS for name in changes):
+        # По версии кэши производных структур узнают, что данные изменились
+        updates["version"] = stored.get("version", 0) + 1
+    return updates
+
+
+def continue_versions(stored_users, users):
+    """Полная перезапись: версия пользователя продолжает сохраненную, а не начинается с нуля
+
+    Иначе новые данные могут получить ту же версию и число транзакций, что и старые,
+    и кэш производных структур другого воркера отдаст структуры старых данных.
+    """
+    versions = {user.get("id"): user.get("version", 0) for user in stored_users if isinstance(user, dict)}
+    for user in users:
+        if isinstance(user, dict):
+            user["version"] = max(versions.get(user.get("id"), 0), user.get("version", 0)) + 1
+    return users
+
+
+def normalize_changes(user_data, changes=None):
+    """Описание изменений: {коллекция: None (перезаписать) | {"added": [...], "updated": [...], "removed": [id, ...]}}
+
+    Служебные данные (USER_META) и user_info всегда перезаписываются целиком (None).
+    Без явного описания перезаписываются все коллекции из user_data.
+    """
+    if changes is not None:
+        return changes
+    changes = {name: None for name in USER_COLLECTIONS + USER_META if name in user_data}
+    if "user_info" in user_data:
+        changes["user_info"] = None
+    return changes
+
+
+def merge_changes(current, new):
+    """Объединение двух описаний изменений одного пользователя"""
+    merged = dict(current)
+    for name, change in new.items():
+        if name in merged and (merged[name] is None or change is None):
+            merged[name] = None
+        elif name in merged:
+            merged[name] = {
+                key: merged[name].get(key, []) + change.get(key, [])
+                for key in CHANGE_KINDS
+            }
+        else:
+            merged[name] = change
+    return merged
+
+
+def replace_records(records, updated):
+    """Замена записей списка на обновленные (по id)"""
+    by_id = {record.get("id"): record for record in updated}
+    for i, record in enumerate(records):
+        if isinstance(record, dict) and record.get("id") in by_id:
+            records[i] = by_id[record.get("id")]
+    return records
+
+
+def remove_records(records, removed):
+    """Удаление записей списка по id"""
+    removed = set(removed)
+    records[:] = [
+        record for record in records
+        if not (isinstance(record, dict) and record.get("id") in removed)
+    ]
+    return records
+
+
+def apply_user_changes(user, user_data, changes):
+    """Перенос изменений из user_data в запись пользователя"""
+    # До записей: перенумерованные записи сохраняются уже с новыми ID
+    user.update(meta_updates(user, user_data, changes))
+    for name, change in changes.items():
+        if name == "user_info":
+            user["risk_profile"] = user_data["user_info"].get("risk_profile", 2)
+        elif name in USER_META:
+            continue
+        elif change is None:
+            user[name] = list(user_data[name])
+        else:
+            records = user.setdefault(name, [])
+            records.extend(change.get("added", []))
+            replace_records(records, change.get("updated", []))
+            if change.get("removed"):
+                remove_records(records, change["removed"])
+    return user
+
+
+class BaseStore:
+    """Интерфейс хранилища данных"""
+
+    def initialize(self):
+        """Создание хранилища, если его еще нет"""
+
+    def invalidate(self):
+        """Сброс внутренних кэшей (после отмененных изменений)"""
+
+    def load_data(self):
+        """Все данные: пользователи и общие справочники"""
+        raise NotImplementedError
+
+    def save_data(self, data):
+        """Полная перезапись данных"""
+        raise NotImplementedError
+
+    def get_user(self, user_id):
+        """Пользователь по ID (None, если не найден)"""
+        raise NotImplementedError
+
+    def find_user(self, username):
+        """Пользователь по имени (None, если не найден)"""
+        raise NotImplementedError
+
+    def create_user(self, user):
+        """Добавление пользователя; None, если имя занято"""
+        raise NotImplementedError
+
+    def load_user_data(self, user_id):
+        """Данные пользователя + общие настройки"""
+        raise NotImplementedError
+
+    def save_user_data(self, user_id, user_data, changes=None):
+        """Сохранение изменений пользователя (см. normalize_changes)"""
+        raise NotImplementedError
+
+    def _keep_aggregates(self, user_id, user, user_data):
+        """Итоги, посчитанные при загрузке старых данных, сохраняются сразу — иначе их
+        пересчитывало бы каждое чтение, пока пользователь ничего не изменит"""
+        if not has_stored_aggregates(user):
+            print(f" Сохраняем итоги пользователя {user_id} (данные без итогов)")
+            # Пустое изменение транзакций: итоги считаются по сохраненным записям
+            self.save_user_data(user_id, user_data, {"transactions": {}})
+        return user_data
+
+    def save_users(self, batch):
+        """Сохранение изменений нескольких пользователей: {user_id: (user_data, changes)}"""
+        ok = True
+        for user_id, (user_data, changes) in batch.items():
+            if not self.save_user_data(user_id, user_data, changes):
+                ok = False
+        return ok
+
+    def sync(self, timeout=None):
+        """Дождаться записи сохраненных изменений на диск"""
+        return True
+
+    def stats(self):
+        """Статистика хранилища"""
+        return {}
+
+
+class CachedFile:
+    """Файл с кэшем разобранного содержимого (перечитывается только при изменении)"""
+
+    # Если файл изменен почти одновременно с чтением, отпечаток ненадежен
+    # (mtime грубее реальной частоты записи) — такой кэш перечитываем
+    RACY_WINDOW_NS = 50_000_000
+
+    def __init__(self, path, reader, writer, lock=None):
+        self.path = path
+        self._reader = reader
+        self._writer = writer
+        self.lock = lock or FileLock(path)
+        # Кэш: (отпечаток файла, время чтения, данные)
+        self._cache = (None, 0, None)
+
+    def key(self):
+        """Отпечаток файла: устройство, inode, размер и время изменения"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+    def invalidate(self):
+        self._cache = (None, 0, None)
+
+    def cached(self):
+        """Данные из кэша, если файл не менялся (None — нужно перечитать)"""
+        key = self.key()
+        cached_key, read_at, cached_data = self._cache
+        if key is not None and key == cached_key and key[3] < read_at - self.RACY_WINDOW_NS:
+            return cached_data
+        return None
+
+    def load(self):
+        cached_data = self.cached()
+        if cached_data is not None:
+            return cached_data
+
+        with self.lock.shared():
+            key = self.key()
+            read_at = time.time_ns()
+            data = self._reader(self.path)
+        if key is not None:
+            self._cache = (key, read_at, data)
+        return data
+
+    def save(self, data):
+        with self.lock.exclusive():
+            try:
+                self._writer(self.path, data)
+            except Exception:
+                self.invalidate()
+                raise
+            # Записанные данные сразу становятся кэшем для этого процесса
+            self._cache = (self.key(), time.time_ns(), data)
+
+
+def read_file(path):
+    """Чтение файла данных (кодек определяется по заголовку); None, если файла нет"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    return decode(raw) if raw.strip() else None
+
+
+def write_file(path, data, codec=DEFAULT_CODEC):
+    """Атомарная запись файла данных выбранным кодеком"""
+    atomic_write(path, encode(data, codec))
+
+
+class JsonStore(BaseStore):
+    """Хранилище в одном JSON-файле
+
+    В компактном JSON рядом пишется индекс смещений пользователей (path + '.idx'):
+    если файл изменил другой воркер, данные одного пользователя читаются
+    из его фрагмента, без разбора всего файла.
+    """
+
+    def __init__(self, path, codec=DEFAULT_CODEC):
+        self.path = path
+        self.codec = codec
+        if codec == "json":
+            writer = write_indexed
+            self._index = OffsetIndex(path)
+        else:
+            writer = partial(write_file, codec=codec)
+            self._index = None
+        self._file = CachedFile(path, self._read_file, writer)
+        self._users = UserIndex()
+        # Запись — чтение свежих данных, изменение и замена файла под одной блокировкой,
+        # поэтому параллельные воркеры не теряют изменения друг друга
+        self._lock = self._file.lock
+
+    def initialize(self):
+        if not os.path.exists(self.path):
+            print(" Создаем файл данных...")
+            self.save_data(create_default_data())
+
+    def invalidate(self):
+        self._file.invalidate()
+        if self._index is not None:
+            self._index.invalidate()
+
+    def load_data(self):
+        """Загрузка данных (повторно разбирает файл только если он изменился)"""
+        return self._file.load()
+
+    @staticmethod
+    def _read_file(path):
+        """Загрузка данных из файла"""
+        if os.path.exists(path):
+            try:
+                data = read_file(path)
+                if data is None:  # Файл пустой
+                    print("⚠️ Файл данных пустой, создаем новую структуру")
+                    return create_default_data()
+
+                # Проверяем структуру данных
+                if not isinstance(data, dict):
+                    print("⚠️ Данные в неправильном формате, создаем новую структуру")
+                    return create_default_data()
+
+                # Проверяем наличие ключей
+                if "users" not in data:
+                    print("⚠️ В данных нет ключа 'users', восстанавливаем структуру")
+                    default_data = create_default_data()
+                    # Сохраняем существующие данные, но добавляем структуру users
+                    data["users"] = default_data.get("users", [])
+                    for key in SHARED_KEYS:
+                        if key not in data:
+                            data[key] = default_data.get(key)
+                    return data
+
+                return data
+
+            except ValueError as e:
+                print(f" Ошибка чтения файла данных: {e}, создаем новую структуру")
+                return create_default_data()
+            except Exception as e:
+                print(f"Неизвестная ошибка при загрузке данных: {e}, создаем новую структуру")
+                return create_default_data()
+        else:
+            print(" Файл данных не существует, создаем новую структуру")
+            return create_default_data()
+
+    def save_data(self, data):
+        """Сохранение данных в файл (полная перезапись)"""
+        if not isinstance(data, dict):
+            print(" Ошибка")
+            return False
+
+        with self._lock.exclusive():
+            continue_versions(self._file.load().get("users", []), data.get("users", []))
+            return self._save(data)
+
+    def _save(self, data):
+        """Запись данных в файл"""
+        # Гарантируем правильную структуру данных
+        if not isinstance(data, dict):
+            print(" Ошибка")
+            return False
+
+        ensure_required_keys(data)
+
+        try:
+            with self._lock.exclusive():
+                self._file.save(data)
+            print(f" Данные сохранены в {self.path}")
+            return True
+        except Exception as e:
+            print(f" Ошибка при сохранении данных: {e}")
+            return False
+
+    def _from_index(self, method, *args):
+        """Чтение через индекс смещений, если кэш устарел: (удалось ли, результат)"""
+        if self._index is None or self._file.cached() is not None:
+            return False, None
+        return getattr(self._index, method)(*args)
+
+    def get_user(self, user_id):
+        found, user = self._from_index("get_user", user_id)
+        if found:
+            return user
+        return self._users.get(self.load_data(), user_id)
+
+    def find_user(self, username):
+        found, user = self._from_index("find_user", username)
+        if found:
+            return user
+        return self._users.find(self.load_data(), username)
+
+    def create_user(self, user):
+        with self._lock.exclusive():
+            return self._create_user(user)
+
+    def _create_user(self, user):
+        data = self.load_data()
+
+        # Гарантируем, что ключ "users" существует
+        if "users" not in data:
+            data["users"] = []
+            print("⚠️ Ключ 'users' не найден в данных, создаем пустой список")
+
+        # Проверяем, не занято ли имя пользователя
+        if self._users.find(data, user["username"]):
+            return None
+
+        user["id"] = self._users.next_id(data)
+        self._users.add(data, user)
+        self._save(data)
+        return user
+
+    def load_user_data(self, user_id):
+        found, user = self._from_index("get_user", user_id)
+        shared = self._index.load_shared() if found and user is not None else None
+        if found and user is None:
+            return None
+        if shared is not None:
+            return self._keep_aggregates(user_id, user, build_user_data(user, shared))
+
+        data = self.load_data()
+        user = self._users.get(data, user_id)
+        if user is None:
+            return None
+        return self._keep_aggregates(user_id, user, build_user_data(user, data))
+
+    def save_user_data(self, user_id, user_data, changes=None):
+        with self._lock.exclusive():
+            data = self.load_data()
+            user = self._users.get(data, user_id)
+            if user is None:
+                return False
+
+            apply_user_changes(user, user_data, normalize_changes(user_data, changes))
+            # Сохраняем ВСЕ данные обратно в файл
+            return self._save(data)
+
+    def save_users(self, batch):
+        """Изменения нескольких пользователей — одной перезаписью файла"""
+        with self._lock.exclusive():
+            data = self.load_data()
+            for user_id, (user_data, changes) in batch.items():
+                user = self._users.get(data, user_id)
+                if user is not None:
+                    apply_user_changes(user, user_data, normalize_changes(user_data, changes))
+            return self._save(data)
+
+def migrate_store(source, target):
+    """Перенос всех данных из одного хранилища в другое (приемник перезаписывается)"""
+    data = source.load_data()
+    if not target.save_data(data):
+        return None
+
+    users = data.get("users", [])
+    return {
+        "users": len(users),
+        **{
+            collection: sum(len(user.get(collection, [])) for user in users)
+            for collection in USER_COLLECTIONS
+        }
+    }
+
+
+def create_store(backend="json", data_file="finance_data.json", sqlite_file="finance_data.db",
+                 data_dir="data", fsync=False, codec=DEFAULT_CODEC, write_behind=0):
+    """Создание хранилища по имени бэкенда
+
+    write_behind > 0 — окно отложенной записи в секундах (см. WriteBehindStore).
+    """
+    if backend == "json":
+        store = JsonStore(data_file, codec=codec)
+    elif backend == "sqlite":
+        from modules.sqlite_store import SqliteStore
+        store = SqliteStore(sqlite_file)
+    elif backend in ("sharded", "journal"):
+        from modules.sharded_store import ShardedJsonStore
+        store = ShardedJsonStore(data_dir, journal=backend == "journal", fsync=fsync, codec=codec)
+    else:
+        raise ValueError(f"Неизвестное хранилище: {backend}")
+
+    if write_behind > 0:
+        from modules.write_behind import WriteBehindStore
+        store = WriteBehindStore(store, window=write_behind)
+    return store
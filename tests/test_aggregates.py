@@ -0,0 +1,84 @@
+import random
+
+from modules.aggregates import AGGREGATES, check_aggregates, compute_aggregates, update_aggregates
+from modules.storage import JsonStore
+
+
+def _transaction(record_id, amount, date="2024-03-05", category="Еда", trans_type=None):
+    if trans_type is None:
+        trans_type = "income" if amount > 0 else "expense"
+    return {"id": record_id, "date": date, "type": trans_type, "amount": amount, "category": category}
+
+
+def _stored(transactions):
+    return {"transactions": transactions, **compute_aggregates(transactions)}
+
+
+def test_random_edits_match_full_recount():
+    rng = random.Random(11)
+    transactions = [_transaction(i, rng.choice([-1, 1]) * rng.randint(1, 500)) for i in range(1, 51)]
+    stored = _stored(transactions)
+    next_id = 51
+    for _ in range(200):
+        kind = rng.choice(["added", "updated", "removed"])
+        if kind == "added" or not transactions:
+            record = _transaction(next_id, rng.choice([-1, 1]) * rng.randint(1, 500),
+                                  f"2024-{rng.randint(1, 12):02d}-01", rng.choice(["Еда", "Кино"]))
+            next_id += 1
+            current = transactions + [record]
+            change = {"added": [record]}
+        elif kind == "updated":
+            old = rng.choice(transactions)
+            record = dict(old, amount=-old["amount"], date="2023-12-31", category="Другое")
+            current = [record if t["id"] == old["id"] else t for t in transactions]
+            change = {"updated": [record]}
+        else:
+            old = rng.choice(transactions)
+            current = [t for t in transactions if t["id"] != old["id"]]
+            change = {"removed": [old["id"]]}
+        result = update_aggregates(stored, {"transactions": current}, change)
+        transactions = current
+        stored = {"transactions": transactions, **result}
+        assert check_aggregates(stored) == []
+
+
+def test_added_and_edited_in_one_batch_counted_once():
+    first, second = _transaction(1, -10.0), _transaction(2, -20.0)
+    edited = dict(second, amount=-25.0, category="Кино")
+    result = update_aggregates(_stored([first]), {}, {"added": [second, _transaction(3, 5.0)], "updated": [edited], "removed": [3]})
+    assert {name: result[name] for name in AGGREGATES} == compute_aggregates([first, edited])
+
+
+def test_empty_months_and_categories_are_dropped():
+    only = _transaction(1, -10.0, "2024-01-15", "Кино")
+    result = update_aggregates(_stored([only]), {}, {"removed": [1]})
+    assert result["monthly"] == {}
+    assert result["by_category"] == {"income": {}, "expense": {}}
+    assert result["totals"]["count"] == {"income": 0, "expense": 0, "other": 0}
+
+
+def test_missing_aggregates_computed_from_stored_records():
+    stored = {"transactions": [_transaction(1, 100.0)]}
+    result = update_aggregates(stored, {}, {"added": [_transaction(2, -5.0)]})
+    assert result == compute_aggregates([_transaction(1, 100.0), _transaction(2, -5.0)])
+
+
+def test_check_reports_drift_and_full_rewrite_repairs_it(tmp_path):
+    store = JsonStore(str(tmp_path / "finance_data.json"))
+    store.initialize()
+    user_data = store.load_user_data(1)
+    user_data["transactions"] = [_transaction(1, 100.0), _transaction(2, -30.0, trans_type="transfer")]
+    assert store.save_user_data(1, user_data, {"transactions": None})
+    assert check_aggregates(store.load_user_data(1)) == []
+
+    # Итоги испорчены в обход хранилища
+    data = store.load_data()
+    data["users"][0]["totals"]["income"] += 1
+    del data["users"][0]["monthly"]["2024-03"]
+    store._save(data)
+    broken = store.load_user_data(1)
+    assert check_aggregates(broken) == ["totals", "monthly"]
+
+    # Как check-aggregates --repair
+    assert store.save_user_data(1, broken, {"transactions": None})
+    assert check_aggregates(store.load_user_data(1)) == []
@@ -0,0 +1,104 @@
+import random
+from datetime import date
+
+import pytest
+
+from modules import columnar
+from modules.columnar import PIVOT_DIMENSIONS, TransactionColumns, _apply_changes
+from modules.dates import parse_day
+
+
+def _transactions(count=300, seed=3):
+    rng = random.Random(seed)
+    result = []
+    for i in range(count):
+        amount = round(rng.uniform(1, 900), 2)
+        result.append({
+            "id": i + 1,
+            "date": f"{rng.randint(2023, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "type": rng.choice(["income", "expense", "transfer"]),
+            "amount": amount,
+            "category": rng.choice(["Еда", "Транспорт", "Аренда", "Зарплата"]),
+        })
+    result.append({"id": count + 1, "date": "не дата", "type": "expense", "amount": 5.0, "category": "Еда"})
+    return result
+
+
+def _label(transaction, dimension):
+    day = parse_day(transaction["date"])
+    if dimension == "month":
+        return transaction["date"][:7]
+    if dimension == "week":
+        return date.fromordinal(day - (day - 1) % 7).isoformat()
+    if dimension == "type":
+        return transaction["type"] if transaction["type"] in ("income", "expense") else "other"
+    return transaction[dimension]
+
+
+def _reference(transactions, rows, columns, start=None, end=None):
+    """Та же сводная таблица перебором словарей"""
+    dated = start is not None or end is not None or rows in ("month", "week") or columns in ("month", "week")
+    cells = {}
+    for t in transactions:
+        day = parse_day(t["date"])
+        if (dated and not day) or (start and day < start) or (end and day > end):
+            continue
+        key = (_label(t, rows), _label(t, columns) if columns else "total")
+        cell = cells.setdefault(key, [0.0, 0])
+        cell[0] += t["amount"]
+        cell[1] += 1
+    return cells
+
+
+def _cells(result):
+    return {
+        (row, column): [result["sum"][r][c], result["count"][r][c]]
+        for r, row in enumerate(result["rows"])
+        for c, column in enumerate(result["columns"])
+        if result["count"][r][c]
+    }
+
+
+@pytest.fixture(params=["arrays", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(columnar, "np", None)
+    return request.param
+
+
+@pytest.mark.parametrize("rows,columns", [
+    (rows, columns) for rows in PIVOT_DIMENSIONS for columns in (None,) + PIVOT_DIMENSIONS if rows != columns
+])
+def test_pivot_matches_dict_scan(backend, rows, columns):
+    transactions = _transactions()
+    result = TransactionColumns.from_records(transactions).pivot(rows, columns)
+    if rows in ("month", "week"):
+        assert result["rows"] == sorted(result["rows"])
+    expected = _reference(transactions, rows, columns)
+    actual = _cells(result)
+    assert actual.keys() == expected.keys()
+    for key, (total, count) in expected.items():
+        assert actual[key] == [pytest.approx(total), count]
+
+
+def test_pivot_period_and_appended_rows(backend):
+    transactions = _transactions()
+    columns = TransactionColumns.from_records(transactions[:200])
+    assert _apply_changes(columns, {"transactions": {"added": transactions[200:]}})
+    assert len(columns) == len(transactions)
+    start, end = parse_day("2023-06-01"), parse_day("2024-02-29")
+    expected = _reference(transactions, "category", "type", start, end)
+    actual = _cells(columns.pivot("category", "type", start, end))
+    assert actual.keys() == expected.keys()
+    for key, (total, count) in expected.items():
+        assert actual[key] == [pytest.approx(total), count]
+
+
+def test_edits_and_removals_rebuild():
+    columns = TransactionColumns.from_records(_transactions(10))
+    assert not _apply_changes(columns, {"transactions": {"updated": [{"id": 1}]}})
+    assert not _apply_changes(columns, {"transactions": {"removed": [1]}})
+    assert not _apply_changes(columns, {"transactions": None})
+    assert _apply_changes(columns, {"goals": None})
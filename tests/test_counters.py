@@ -0,0 +1,55 @@
+from modules.aggregates import check_aggregates
+from modules.storage import JsonStore, allocate_id, reconcile_counters, renumber_duplicates
+
+
+def _transaction(record_id, amount=-10.0):
+    return {"id": record_id, "date": "2024-03-05", "type": "expense", "amount": amount, "category": "Еда"}
+
+
+def test_allocate_id_continues_after_largest_id_without_counters():
+    user_data = {"transactions": [_transaction(3), _transaction(7), {"id": "x"}]}
+    assert allocate_id(user_data, "transactions") == 8
+    assert allocate_id(user_data, "transactions") == 9
+    assert allocate_id(user_data, "goals") == 1
+    assert user_data["counters"] == {"transactions": 9, "goals": 1}
+
+
+def test_reconcile_keeps_ids_after_stored_counter():
+    added = [_transaction(6), _transaction(7)]
+    user_data = {"counters": {"transactions": 7, "goals": 2}}
+    counters = reconcile_counters({"transactions": 5, "goals": 4}, user_data, {"transactions": {"added": added}})
+    assert [t["id"] for t in added] == [6, 7]
+    assert counters == {"transactions": 7, "goals": 4}
+
+
+def test_reconcile_renumbers_ids_taken_by_concurrent_save():
+    """Параллельный запрос уже сохранил ID 6 и 7 — добавленные записи идут после них"""
+    added = [_transaction(6), _transaction(7)]
+    user_data = {"counters": {"transactions": 7}}
+    counters = reconcile_counters({"transactions": 7}, user_data, {"transactions": {"added": added}})
+    assert [t["id"] for t in added] == [8, 9]
+    assert counters == {"transactions": 9}
+
+
+def test_renumber_duplicates_keeps_first_and_skips_taken_ids():
+    user = {"transactions": [_transaction(1), _transaction(2), _transaction(2), _transaction(3), _transaction(2)]}
+    assert renumber_duplicates(user, "transactions") == 2
+    assert [t["id"] for t in user["transactions"]] == [1, 2, 4, 3, 5]
+    assert user["counters"]["transactions"] == 5
+    assert renumber_duplicates(user, "transactions") == 0
+
+
+def test_stale_copies_save_distinct_ids(tmp_path):
+    """Два запроса загрузили данные до записи друг друга и выдали одинаковый ID"""
+    store = JsonStore(str(tmp_path / "finance_data.json"))
+    store.initialize()
+    copies = [store.load_user_data(1), store.load_user_data(1)]
+    for amount, user_data in zip((-5.0, 40.0), copies):
+        transaction = dict(_transaction(allocate_id(user_data, "transactions"), amount))
+        user_data["transactions"].append(transaction)
+        assert store.save_user_data(1, user_data, {"transactions": {"added": [transaction]}, "counters": None})
+
+    user_data = store.load_user_data(1)
+    assert [t["id"] for t in user_data["transactions"]] == [1, 2]
+    assert user_data["counters"]["transactions"] == 2
+    assert check_aggregates(user_data) == []
@@ -0,0 +1,92 @@
+from modules.derived import DerivedCache
+
+
+def _user_data(user_id, version, transactions):
+    return {"user_info": {"id": user_id}, "version": version, "transactions": transactions}
+
+
+def _added(record_id):
+    return {"transactions": {"added": [{"id": record_id}]}}
+
+
+def _cache(max_entries=DerivedCache.MAX_ENTRIES, applies=True):
+    cache = DerivedCache(max_entries)
+    builds = []
+
+    def build(user_data):
+        builds.append(user_data["version"])
+        return [record["id"] for record in user_data["transactions"]]
+
+    def apply(ids, changes):
+        if not applies:
+            return False
+        ids.extend(record["id"] for record in changes["transactions"]["added"])
+        return True
+
+    cache.register("ids", build, apply)
+    return cache, builds
+
+
+def test_built_once_per_version():
+    cache, builds = _cache()
+    user_data = _user_data(1, 3, [{"id": 1}])
+    assert cache.get("ids", user_data) is cache.get("ids", user_data)
+    assert builds == [3]
+    # Другой воркер записал изменения — версия другая, структура строится заново
+    assert cache.get("ids", _user_data(1, 4, [{"id": 1}, {"id": 2}])) == [1, 2]
+    assert builds == [3, 4]
+
+
+def test_own_save_applied_in_place():
+    cache, builds = _cache()
+    user_data = _user_data(1, 3, [{"id": 1}])
+    ids = cache.get("ids", user_data)
+    user_data["transactions"].append({"id": 2})
+    cache.saved(1, user_data, _added(2))
+    # Хранилище сохранило данные с версией 4
+    assert cache.get("ids", _user_data(1, 4, user_data["transactions"])) is ids
+    assert ids == [1, 2]
+    assert builds == [3]
+
+
+def test_rebuilt_when_apply_declines_or_entry_is_stale():
+    cache, builds = _cache(applies=False)
+    user_data = _user_data(1, 3, [{"id": 1}])
+    cache.get("ids", user_data)
+    user_data["transactions"].append({"id": 2})
+    cache.saved(1, user_data, _added(2))
+    assert cache.get("ids", _user_data(1, 4, user_data["transactions"])) == [1, 2]
+    assert builds == [3, 4]
+
+    # Структура построена уже с добавленной записью — применять изменение к ней нельзя
+    cache, builds = _cache()
+    user_data = _user_data(1, 3, [{"id": 1}, {"id": 2}])
+    cache.get("ids", user_data)
+    cache.saved(1, user_data, _added(2))
+    assert cache.get("ids", _user_data(1, 4, user_data["transactions"])) == [1, 2]
+    assert builds == [3, 4]
+
+
+def test_saves_without_collections_keep_entries():
+    cache, builds = _cache()
+    user_data = _user_data(1, 3, [{"id": 1}])
+    cache.get("ids", user_data)
+    cache.saved(1, user_data, {"user_info": None})
+    cache.get("ids", user_data)
+    assert builds == [3]
+
+
+def test_eviction_and_discard():
+    cache, builds = _cache(max_entries=2)
+    for user_id in (1, 2, 3):
+        cache.get("ids", _user_data(user_id, 1, []))
+    cache.get("ids", _user_data(1, 1, []))
+    assert builds == [1, 1, 1, 1]
+    cache.get("ids", _user_data(3, 1, []))
+    assert len(builds) == 4
+    cache.discard(3)
+    cache.get("ids", _user_data(3, 1, []))
+    assert len(builds) == 5
+    cache.discard()
+    cache.get("ids", _user_data(3, 1, []))
+    assert len(builds) == 6
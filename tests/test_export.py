@@ -0,0 +1,85 @@
+import csv
+import gzip
+import io
+import json
+
+from modules import export
+from modules.aggregates import compute_aggregates
+from modules.export import encode_chunks, gzip_chunks, iter_csv, iter_json
+from modules.storage import USER_STATE_KEYS
+
+
+def _user_data(count=2000):
+    transactions = [
+        {"id": i, "date": "2024-03-05", "type": "expense" if i % 2 else "income", "amount": i * 1.5,
+         "category": "Еда", "description": f"Покупка; «{i}»\nвторая строка" if i % 7 == 0 else f"Покупка {i}"}
+        for i in range(1, count + 1)
+    ]
+    return {
+        "user_info": {"id": 1, "username": "demo"},
+        "transactions": transactions,
+        "investments": [{"id": 1, "name": "SBER", "type": "Акции", "amount": 1000}],
+        "goals": [{"id": 1, "name": "Отпуск", "target": 100000, "saved": 500, "deadline": "2030-01-01"}],
+        "counters": {"transactions": count},
+        "version": 7,
+        **compute_aggregates(transactions),
+    }
+
+
+def _rows(text):
+    return list(csv.reader(io.StringIO(text), delimiter=';'))
+
+
+def test_csv_chunks_are_bounded_and_join_into_whole_document(monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_SIZE", 4096)
+    user_data = _user_data()
+    chunks = list(iter_csv(user_data))
+    assert len(chunks) > 10
+    assert all(len(chunk) < 4096 + 512 for chunk in chunks)
+
+    rows = _rows("".join(chunks))
+    assert rows[:2] == [["ТРАНЗАКЦИИ"], ["ID", "Дата", "Тип", "Категория", "Сумма (₽)", "Описание"]]
+    transactions = rows[2:2 + len(user_data["transactions"])]
+    assert [row[5] for row in transactions] == [t["description"] for t in user_data["transactions"]]
+    assert transactions[0][2] == "Расход" and transactions[1][2] == "Доход"
+    rest = rows[2 + len(transactions):]
+    assert rest[:3] == [[], ["ИНВЕСТИЦИИ"], ["ID", "Название", "Тип", "Сумма (₽)", "Текущая стоимость (₽)", "Дата покупки", "Заметки"]]
+    assert rest[3] == ["1", "SBER", "Акции", "1000", "1000", "", ""]
+    assert rest[-1] == ["1", "Отпуск", "", "100000", "500", "2030-01-01"]
+
+
+def test_csv_single_section_and_empty_data():
+    assert _rows("".join(iter_csv(_user_data(3), sections=("goals",))))[0] == ["ЦЕЛИ"]
+    assert _rows("".join(iter_csv({})))[1:3] == [["ID", "Дата", "Тип", "Категория", "Сумма (₽)", "Описание"], []]
+
+
+def test_bom_only_at_stream_start_and_gzip_round_trip():
+    chunks = list(iter_csv(_user_data()))
+    encoded = list(encode_chunks(chunks, 'utf-8-sig'))
+    data = b"".join(encoded)
+    assert data.startswith(b"\xef\xbb\xbf") and data.count(b"\xef\xbb\xbf") == 1
+    assert data.decode('utf-8-sig') == "".join(chunks)
+    assert gzip.decompress(b"".join(gzip_chunks(iter(encoded)))) == data
+
+
+def _exported(user_data):
+    return {key: value for key, value in user_data.items() if key not in USER_STATE_KEYS}
+
+
+def test_json_pretty_matches_previous_output_without_store_state():
+    user_data = _user_data(50)
+    data = b"".join(iter_json(user_data))
+    assert data.decode('utf-8') == json.dumps(_exported(user_data), ensure_ascii=False, indent=2)
+
+
+def test_json_compact_and_ndjson(monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_SIZE", 4096)
+    user_data = _user_data()
+    chunks = list(iter_json(user_data, "compact"))
+    assert len(chunks) > 10 and all(len(chunk) < 4096 + 512 for chunk in chunks)
+    assert json.loads(b"".join(chunks)) == _exported(user_data)
+
+    lines = [json.loads(line) for line in b"".join(iter_json(user_data, "ndjson")).splitlines()]
+    assert lines[0] == {"collection": "user", "record": {"user_info": user_data["user_info"]}}
+    assert [line["record"] for line in lines if line["collection"] == "transactions"] == user_data["transactions"]
+    assert [line["collection"] for line in lines[-2:]] == ["investments", "goals"]
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+
+from modules.export import iter_csv, iter_json
+from modules.importer import iter_batches, iter_csv_rows, iter_ndjson_rows, normalize_transaction, open_text
+
+
+def _transaction(record_id, amount, trans_type, description=""):
+    return {"id": record_id, "date": "2024-03-05", "type": trans_type, "amount": amount,
+            "category": "Еда", "description": description}
+
+
+EXPORTED = {
+    "user_info": {"id": 1},
+    "transactions": [
+        _transaction(1, -1250.5, "expense", "Обед; с «кавычками»"),
+        _transaction(2, 50000.0, "income", "Зарплата\nза март"),
+    ],
+    "goals": [{"id": 1, "name": "Отпуск", "target": 1000}],
+}
+
+
+def _imported(rows):
+    return [
+        {key: t[key] for key in ("date", "type", "amount", "category", "description")}
+        for batch, errors in iter_batches(rows) for t in batch
+    ]
+
+
+def _expected():
+    return [{key: value for key, value in t.items() if key != "id"} for t in EXPORTED["transactions"]]
+
+
+def test_normalize_sign_type_and_formats():
+    t = normalize_transaction({"amount": "1 250,50", "type": "Расход", "date": " 2024-03-05 "})
+    assert (t["amount"], t["type"], t["date"], t["category"]) == (-1250.5, "expense", "2024-03-05", "Другое")
+    assert normalize_transaction({"amount": -7, "date": "2024-03-05"})["type"] == "expense"
+    assert normalize_transaction({"amount": "-7", "type": "income", "date": "2024-03-05"})["amount"] == 7.0
+
+
+@pytest.mark.parametrize("row,error", [
+    ({"date": "2024-03-05"}, "Не указана сумма"),
+    ({"amount": "abc", "date": "2024-03-05"}, "Некорректная сумма"),
+    ({"amount": "nan", "date": "2024-03-05"}, "Некорректная сумма"),
+    ({"amount": True, "date": "2024-03-05"}, "Некорректная сумма"),
+    ({"amount": 5, "type": "перевод", "date": "2024-03-05"}, "Неизвестный тип"),
+    ({"amount": 5}, "Не указана дата"),
+    ({"amount": 5, "date": "2024-13-40"}, "Некорректная дата"),
+])
+def test_normalize_rejects_bad_rows(row, error):
+    with pytest.raises(ValueError, match=error):
+        normalize_transaction(row)
+
+
+def test_csv_export_imports_back():
+    data = "".join(iter_csv(EXPORTED)).encode('utf-8-sig')
+    assert _imported(iter_csv_rows(open_text(io.BytesIO(data)))) == _expected()
+
+
+def test_csv_without_amount_column_is_rejected():
+    with pytest.raises(ValueError):
+        list(iter_csv_rows(io.StringIO("Дата;Описание\n2024-03-05;x\n")))
+
+
+def test_ndjson_export_imports_back_and_reports_bad_lines():
+    data = b"".join(iter_json(EXPORTED, "ndjson")) + b'{"amount":\n[1]\n\n{"amount": 3, "date": "bad"}\n'
+    rows = list(iter_ndjson_rows(open_text(io.BytesIO(data))))
+    assert _imported(iter(rows[:2])) == _expected()
+    errors = [error for _, errors in iter_batches(iter(rows)) for error in errors]
+    assert [error["line"] for error in errors] == [5, 6, 8]
+    assert errors[1]["error"] == "Строка должна быть объектом JSON"
+
+
+def test_batches_count_rows_and_errors():
+    rows = [(i, {"amount": i, "date": "2024-03-05"} if i % 3 else {"amount": "x"}) for i in range(1, 11)]
+    batches = list(iter_batches(iter(rows), batch_size=4))
+    assert [(len(batch), len(errors)) for batch, errors in batches] == [(3, 1), (3, 1), (1, 1)]
+    assert [error["line"] for _, errors in batches for error in errors] == [3, 6, 9]
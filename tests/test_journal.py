@@ -0,0 +1,97 @@
+from modules.aggregates import check_aggregates
+from modules.journal import UserJournal
+from modules.sharded_store import ShardedJsonStore
+from modules.storage import allocate_id
+
+
+def _entry(seq):
+    return {"seq": seq, "collection": "goals", "op": "added", "records": [{"id": seq, "name": f"Цель {seq}"}]}
+
+
+def _add_transaction(store, user_id, amount, date="2024-03-05", category="Еда"):
+    user_data = store.load_user_data(user_id)
+    transaction = {
+        "id": allocate_id(user_data, "transactions"),
+        "date": date,
+        "type": "income" if amount > 0 else "expense",
+        "amount": amount,
+        "category": category,
+        "description": "",
+    }
+    user_data["transactions"].append(transaction)
+    assert store.save_user_data(user_id, user_data, {"transactions": {"added": [transaction]}, "counters": None})
+    return transaction
+
+
+def test_append_after_torn_write_drops_partial_line(tmp_path):
+    """Недописанная строка от сбоя не склеивается со следующей записью"""
+    journal = UserJournal(str(tmp_path / "1.journal.jsonl"))
+    journal.append([_entry(1)])
+    with open(journal.path, "ab") as f:
+        f.write(b'{"seq":2,"collection":"go')
+
+    # Пока строка не дописана, читатель ее не видит
+    entries, offset = journal.read_from(0)
+    assert [entry["seq"] for entry in entries] == [1]
+
+    journal.append([_entry(3)])
+    entries, offset = journal.read_from(0)
+    assert [entry["seq"] for entry in entries] == [1, 3]
+    assert offset == journal.size()
+
+
+def test_read_skips_corrupt_line(tmp_path):
+    journal = UserJournal(str(tmp_path / "1.journal.jsonl"))
+    journal.append([_entry(1)])
+    with open(journal.path, "ab") as f:
+        f.write(b'{"seq":2,"coll{"seq":\n')
+    journal.append([_entry(3)])
+
+    entries, offset = journal.read_from(0)
+    assert [entry["seq"] for entry in entries] == [1, 3]
+    assert offset == journal.size()
+
+
+def test_replay_and_compaction_keep_records_and_aggregates(tmp_path):
+    root = str(tmp_path / "data")
+    store = ShardedJsonStore(root, journal=True)
+    store.initialize()
+    for i in range(20):
+        _add_transaction(store, 1, -(i + 1.0) if i % 2 else i + 1.0, date=f"2024-{i % 12 + 1:02d}-10")
+
+    # Новый процесс: снимок + журнал
+    replayed = ShardedJsonStore(root, journal=True).load_user_data(1)
+    assert [t["id"] for t in replayed["transactions"]] == list(range(1, 21))
+    assert replayed["counters"]["transactions"] == 20
+    assert check_aggregates(replayed) == []
+
+    store.compact(1)
+    assert store._journal(1).size() == 0
+    compacted = ShardedJsonStore(root, journal=True).load_user_data(1)
+    assert compacted["transactions"] == replayed["transactions"]
+    assert compacted["version"] == replayed["version"]
+    assert check_aggregates(compacted) == []
+
+    # Дозапись после свертки читается поверх снимка
+    _add_transaction(store, 1, -7.0)
+    latest = ShardedJsonStore(root, journal=True).load_user_data(1)
+    assert len(latest["transactions"]) == 21
+    assert check_aggregates(latest) == []
+
+
+def test_journal_append_does_not_carry_aggregates(tmp_path):
+    """В журнал пишутся только изменения записей, счетчики и версия"""
+    store = ShardedJsonStore(str(tmp_path / "data"), journal=True)
+    store.initialize()
+    _add_transaction(store, 1, -5.0)
+    entries, _ = store._journal(1).read_from(0)
+    assert {entry["collection"] for entry in entries} == {"transactions", "counters", "version"}
+
+
+def test_stale_temp_files_removed_on_open(tmp_path):
+    root = tmp_path / "data"
+    ShardedJsonStore(str(root), journal=True).initialize()
+    stale = root / "users" / "1.json.abc123.tmp"
+    stale.write_bytes(b"{")
+    ShardedJsonStore(str(root), journal=True)
+    assert not stale.exists()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from modules import storage
+from modules.aggregates import AGGREGATES, compute_aggregates
+from modules.sharded_store import ShardedJsonStore, migrate_json_to_shards
+from modules.sqlite_store import migrate_json_to_sqlite, SqliteStore
+from modules.storage import JsonStore, create_default_data
+
+
+def _legacy_file(path):
+    """Файл в формате до появления итогов: транзакции есть, итогов нет"""
+    data = create_default_data()
+    user = data["users"][0]
+    user["transactions"] = [
+        {"id": i, "date": f"2024-{i % 12 + 1:02d}-10", "type": "expense", "amount": -float(i),
+         "category": "Еда", "description": ""}
+        for i in range(1, 31)
+    ]
+    for name in AGGREGATES:
+        user.pop(name, None)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return user["id"], user["transactions"]
+
+
+def _open(backend, tmp_path, source):
+    if backend == "json":
+        return JsonStore(str(source))
+    if backend == "sqlite":
+        migrate_json_to_sqlite(str(source), str(tmp_path / "finance_data.db"))
+        return SqliteStore(str(tmp_path / "finance_data.db"))
+    migrate_json_to_shards(str(source), str(tmp_path / "data"))
+    return ShardedJsonStore(str(tmp_path / "data"), journal=backend == "journal")
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "sharded", "journal"])
+def test_aggregates_saved_on_first_load(backend, tmp_path, monkeypatch):
+    """Итоги старых данных считаются один раз и сохраняются, а не при каждом чтении"""
+    source = tmp_path / "finance_data.json"
+    user_id, transactions = _legacy_file(source)
+    store = _open(backend, tmp_path, source)
+    expected = compute_aggregates(transactions)
+
+    first = store.load_user_data(user_id)
+    assert {name: first[name] for name in AGGREGATES} == expected
+
+    calls = []
+    monkeypatch.setattr(storage, "compute_aggregates", lambda records: calls.append(records))
+    for reopened in (store, type(store)(*_store_args(store))):
+        loaded = reopened.load_user_data(user_id)
+        assert {name: loaded[name] for name in AGGREGATES} == expected
+        assert loaded["transactions"] == transactions
+    assert calls == []
+
+
+def _store_args(store):
+    if isinstance(store, ShardedJsonStore):
+        return store.root, store.journal
+    return (store.path,)
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from modules.aggregates import compute_aggregates, update_aggregates
+from modules.reports import build_report, category_summary, monthly_summary
+from modules.utils import get_category_summary, get_monthly_summary
+
+
+def _transactions(count=400, seed=7):
+    rng = random.Random(seed)
+    result = []
+    for i in range(count):
+        amount = round(rng.uniform(1, 5000), 2)
+        income = rng.random() < 0.3
+        result.append({
+            "id": i + 1,
+            "date": f"{rng.randint(2022, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "type": "income" if income else "expense",
+            "amount": amount if income else -amount,
+            "category": rng.choice(["Еда", "Транспорт", "Аренда", "Зарплата", "Подарок", "Другое"]),
+        })
+    return result
+
+
+def _assert_same(rollup, listed):
+    assert list(rollup) == list(listed)
+    for key, row in listed.items():
+        for field, value in row.items():
+            assert rollup[key][field] == pytest.approx(value)
+
+
+def test_rollup_summaries_match_list_summaries():
+    transactions = _transactions()
+    aggregates = compute_aggregates(transactions)
+    _assert_same(monthly_summary(aggregates["monthly"]), get_monthly_summary(transactions))
+    for trans_type in ("expense", "income"):
+        _assert_same(
+            category_summary(aggregates["by_category"], trans_type),
+            get_category_summary(transactions, trans_type)
+        )
+
+
+def test_rollups_follow_edits_and_deletes():
+    transactions = _transactions()
+    aggregates = compute_aggregates(transactions)
+    moved = dict(transactions[0], date="2021-06-15", category="Новая", amount=-12.5, type="expense")
+    removed = [transactions[1]["id"], transactions[2]["id"]]
+    aggregates = update_aggregates(
+        {**aggregates, "transactions": transactions},
+        {},
+        {"updated": [moved], "removed": removed}
+    )
+    current = [moved] + transactions[3:]
+    _assert_same(monthly_summary(aggregates["monthly"]), get_monthly_summary(current))
+    for trans_type in ("expense", "income"):
+        _assert_same(category_summary(aggregates["by_category"], trans_type), get_category_summary(current, trans_type))
+    assert aggregates["monthly"]["2021-06"] == [0.0, 12.5, -12.5, 1]
+
+
+def test_monthly_window():
+    aggregates = compute_aggregates(_transactions())
+    window = monthly_summary(aggregates["monthly"], months=100, start="2023-03", end="2023-05")
+    assert list(window) == ["2023-05", "2023-04", "2023-03"]
+    assert list(monthly_summary(aggregates["monthly"], months=2)) == ["2024-12", "2024-11"]
+
+
+def test_empty_rollups():
+    aggregates = compute_aggregates([])
+    assert monthly_summary(aggregates["monthly"]) == {}
+    assert category_summary(aggregates["by_category"], "expense") == {}
+
+
+def test_report_without_stored_rollups_matches_stored():
+    transactions = _transactions()
+    user_data = {"transactions": transactions, "investments": [], "goals": [{"target": 100, "saved": 25}]}
+    legacy = build_report(user_data)
+    stored = build_report({**user_data, **compute_aggregates(transactions)})
+    assert legacy.monthly == stored.monthly
+    assert legacy.expense_categories == stored.expense_categories
+    assert stored.transactions_count == len(transactions)
+    assert stored.goals_progress == 25
@@ -0,0 +1,51 @@
+from modules.indexes import SearchIndex, _apply_search_changes, tokenize
+
+
+USER_DATA = {
+    "transactions": [
+        {"id": 1, "description": "Обед в столовой"},
+        {"id": 2, "description": "Ёлка и игрушки"},
+        {"id": 3, "description": "Столик для дачи"},
+        {"id": 4, "description": None},
+    ],
+    "investments": [{"id": 1, "name": "Сбербанк", "notes": "Дивиденды раз в год"}],
+    "goals": [{"id": 1, "name": "Дача", "description": "Ремонт столовой"}],
+}
+
+
+def _found(results):
+    return [(score, collection, record["id"]) for score, collection, record in results]
+
+
+def test_tokenize_folds_case_and_yo():
+    assert tokenize("Ёлка, ДАЧА-2024!") == ["елка", "дача", "2024"]
+    assert tokenize(None) == []
+
+
+def test_prefix_search_ranks_whole_words_then_newest():
+    index = SearchIndex.from_user_data(USER_DATA)
+    assert _found(index.search("столовой")) == [(2, "transactions", 1), (2, "goals", 1)]
+    assert _found(index.search("стол")) == [(1, "transactions", 3), (1, "transactions", 1), (1, "goals", 1)]
+    assert _found(index.search("елк")) == [(1, "transactions", 2)]
+    assert _found(index.search("дача ремонт")) == [(2, "goals", 1)]
+    assert _found(index.search("стол", limit=1)) == [(1, "transactions", 3)]
+    assert index.search("стол", collections={"goals"})[0][1] == "goals"
+    assert index.search("нет такого") == []
+    assert index.search("  ") == []
+
+
+def test_changes_applied_in_place():
+    index = SearchIndex.from_user_data(USER_DATA)
+    changes = {
+        "transactions": {
+            "added": [{"id": 5, "description": "Такси до дачи"}],
+            "updated": [{"id": 3, "description": "Кресло"}],
+            "removed": [1],
+        }
+    }
+    assert _apply_search_changes(index, changes)
+    assert _found(index.search("дачи")) == [(2, "transactions", 5)]
+    assert _found(index.search("стол")) == [(1, "goals", 1)]
+    assert "столик" not in index.vocabulary and "обед" not in index.postings
+    assert index.vocabulary == sorted(index.vocabulary)
+    assert not _apply_search_changes(index, {"goals": None})
@@ -0,0 +1,49 @@
+import multiprocessing
+
+from modules.aggregates import check_aggregates
+from modules.sqlite_store import SqliteStore
+from modules.storage import allocate_id
+
+
+WORKERS = 6
+APPENDS = 40
+
+
+def _append_transactions(path, worker):
+    """Воркер: добавляет транзакции по одной, как запрос /api/add-transaction"""
+    store = SqliteStore(path)
+    for i in range(APPENDS):
+        user_data = store.load_user_data(1)
+        transaction = {
+            "id": allocate_id(user_data, "transactions"),
+            "date": f"2024-{worker + 1:02d}-{i % 28 + 1:02d}",
+            "type": "expense" if i % 2 else "income",
+            "amount": -(i + 1.0) if i % 2 else i + 1.0,
+            "category": f"Категория {i % 3}",
+            "description": f"воркер {worker}",
+        }
+        user_data["transactions"].append(transaction)
+        assert store.save_user_data(1, user_data, {"transactions": {"added": [transaction]}, "counters": None})
+
+
+def test_concurrent_appends_keep_ids_and_aggregates(tmp_path):
+    """Параллельные воркеры не выдают одинаковых ID и не теряют изменения итогов"""
+    path = str(tmp_path / "finance_data.db")
+    SqliteStore(path).initialize()
+
+    workers = [
+        multiprocessing.Process(target=_append_transactions, args=(path, worker))
+        for worker in range(WORKERS)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert all(process.exitcode == 0 for process in workers)
+
+    user = SqliteStore(path).load_data()["users"][0]
+    ids = [t["id"] for t in user["transactions"]]
+    assert len(ids) == WORKERS * APPENDS
+    assert len(set(ids)) == len(ids)
+    assert user["counters"]["transactions"] == max(ids)
+    assert check_aggregates(user) == []
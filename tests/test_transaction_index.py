@@ -0,0 +1,67 @@
+import pytest
+
+from modules.dates import parse_day
+from modules.indexes import TransactionIndex, format_cursor, parse_cursor
+
+
+def _transaction(record_id, date, amount=-10.0, category="Еда", trans_type="expense"):
+    return {"id": record_id, "date": date, "type": trans_type, "amount": amount, "category": category}
+
+
+TRANSACTIONS = [
+    _transaction(1, "2024-01-10"),
+    _transaction(2, "2024-02-10", 500.0, "Зарплата", "income"),
+    _transaction(3, "2025-13-01"),                # некорректная дата
+    _transaction(4, "2024-02-10", -30.0, "Транспорт"),
+    _transaction(5, "2025-03-05T10:00:00"),       # дата со временем (старые данные)
+    _transaction(6, "2024-03-01", -70.0),
+]
+
+
+def _all_pages(index, limit, **filters):
+    ids, before = [], None
+    while True:
+        page, before = index.page(before, limit, **filters)
+        ids += [record["id"] for record in page]
+        if before is None:
+            return ids
+        before = parse_cursor(format_cursor(before))
+
+
+def test_pages_list_every_row_newest_first_undated_last():
+    index = TransactionIndex.from_records(TRANSACTIONS)
+    assert len(index) == len(TRANSACTIONS)
+    for limit in (1, 2, 4, 100):
+        assert _all_pages(index, limit) == [6, 4, 2, 1, 5, 3]
+
+
+def test_period_excludes_rows_without_date():
+    index = TransactionIndex.from_records(TRANSACTIONS)
+    assert _all_pages(index, 2, end=parse_day("2024-02-28")) == [4, 2, 1]
+    assert _all_pages(index, 2, start=parse_day("2024-02-01")) == [6, 4, 2]
+
+
+def test_filters_intersect_postings():
+    index = TransactionIndex.from_records(TRANSACTIONS)
+    assert _all_pages(index, 1, category="Еда") == [6, 1, 5, 3]
+    assert _all_pages(index, 1, trans_type="income") == [2]
+    assert _all_pages(index, 10, category="Еда", min_amount=20) == [6]
+    assert _all_pages(index, 10, max_amount=30) == [4, 1, 5, 3]
+
+
+def test_add_and_remove_keep_order():
+    index = TransactionIndex.from_records(TRANSACTIONS)
+    index.add(_transaction(7, "2024-02-15"))
+    index.add(_transaction(1, "2024-04-01"))  # изменение даты — запись переезжает
+    index.remove(5)
+    assert _all_pages(index, 3) == [1, 6, 7, 4, 2, 3]
+    assert _all_pages(index, 3, category="Еда") == [1, 6, 7, 3]
+
+
+def test_cursor_round_trip_and_errors():
+    assert parse_cursor(format_cursor((parse_day("2024-02-10"), 4))) == (parse_day("2024-02-10"), 4)
+    assert format_cursor((0, 3)) == ",3"
+    assert parse_cursor(",3") == (0, 3)
+    for value in ("", "2024-02-10", "2024-13-10,4", "2024-02-10,x"):
+        with pytest.raises(ValueError):
+            parse_cursor(value)
@@ -0,0 +1,114 @@
+import threading
+
+from modules.aggregates import check_aggregates, compute_aggregates
+from modules.storage import JsonStore, allocate_id
+from modules.write_behind import WriteBehindStore
+
+
+class RecordingStore(JsonStore):
+    """JsonStore, который запоминает групповые записи и может отказать в записи"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.batches = []
+        self.failures = 0
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def save_users(self, batch):
+        self.writing.set()
+        self.release.wait()
+        self.batches.append({user_id: changes for user_id, (_, changes) in batch.items()})
+        if self.failures:
+            self.failures -= 1
+            return False
+        return super().save_users(batch)
+
+
+def _add_transaction(store, amount, date="2024-03-05"):
+    user_data = store.load_user_data(1)
+    transaction = {
+        "id": allocate_id(user_data, "transactions"),
+        "date": date,
+        "type": "income" if amount > 0 else "expense",
+        "amount": amount,
+        "category": "Еда",
+        "description": "",
+    }
+    user_data["transactions"].append(transaction)
+    assert store.save_user_data(1, user_data, {"transactions": {"added": [transaction]}, "counters": None})
+    return transaction
+
+
+def _stores(tmp_path):
+    inner = RecordingStore(str(tmp_path / "finance_data.json"))
+    inner.initialize()
+    return inner, WriteBehindStore(inner, window=60)
+
+
+def test_saves_in_window_merge_into_one_write(tmp_path):
+    inner, store = _stores(tmp_path)
+    added = [_add_transaction(store, -(i + 1.0)) for i in range(5)]
+
+    # До записи изменения видны из памяти, итоги учитывают все незаписанные транзакции
+    pending = store.load_user_data(1)
+    assert pending["transactions"] == added
+    assert check_aggregates(pending) == []
+    assert inner.batches == []
+
+    assert store.sync()
+    assert len(inner.batches) == 1
+    assert [t["id"] for t in inner.batches[0][1]["transactions"]["added"]] == [1, 2, 3, 4, 5]
+    assert store.stats()["coalescing_ratio"] == 5
+
+    inner.invalidate()
+    stored = inner.load_user_data(1)
+    assert stored["transactions"] == added
+    assert stored["counters"]["transactions"] == 5
+    assert check_aggregates(stored) == []
+
+
+def test_failed_write_is_requeued_before_newer_saves(tmp_path):
+    inner, store = _stores(tmp_path)
+    inner.failures = 1
+    inner.release.clear()
+    first = _add_transaction(store, -10.0)
+    failed = []
+    syncing = threading.Thread(target=lambda: failed.append(store.sync()))
+    syncing.start()
+    assert inner.writing.wait(5)
+
+    # Новое сохранение приходит, пока идет запись, которая завершится ошибкой
+    second = _add_transaction(store, 25.0, date="2024-04-01")
+    inner.release.set()
+    syncing.join()
+    assert failed == [False]
+    assert store.stats()["errors"] == 1
+    assert store.load_user_data(1)["transactions"] == [first, second]
+    assert check_aggregates(store.load_user_data(1)) == []
+    assert store.sync()
+
+    retried = inner.batches[-1][1]["transactions"]["added"]
+    assert [t["id"] for t in retried] == [first["id"], second["id"]]
+    inner.invalidate()
+    stored = inner.load_user_data(1)
+    assert stored["transactions"] == [first, second]
+    assert {name: stored[name] for name in ("totals", "monthly", "by_category")} == \
+        compute_aggregates([first, second])
+
+
+def test_reads_during_write_see_pending_changes(tmp_path):
+    inner, store = _stores(tmp_path)
+    inner.release.clear()
+    transaction = _add_transaction(store, -3.0)
+    syncing = threading.Thread(target=store.sync)
+    syncing.start()
+    try:
+        assert inner.writing.wait(5)
+        # Запись идет (ждет release): данные читаются из _writing
+        assert store.load_user_data(1)["transactions"] == [transaction]
+    finally:
+        inner.release.set()
+        syncing.join()
+    assert inner.load_user_data(1)["transactions"] == [transaction]
@@ -0,0 +1,177 @@
+from modules.storage import USER_COLLECTIONS, USER_META
+
+
+# Небольшие коллекции, записи которых редактируются на месте (goal["saved"] = ...):
+# их изменения находим сравнением с копией, снятой при загрузке.
+# Транзакции только добавляются/удаляются через список — копии для них не снимаем.
+SNAPSHOT_COLLECTIONS = ("investments", "goals")
+
+
+class ChangeTracker:
+    """Журнал изменений данных пользователя за время запроса"""
+
+    def __init__(self):
+        self._replaced = set()
+        self._added = {}
+        self._updated = {}
+        self._removed = {}
+        self._snapshots = {}
+        self._meta = {}
+        self._user_info = None
+
+    def snapshot(self, user_data):
+        """Копия редактируемых записей на момент загрузки"""
+        for name in SNAPSHOT_COLLECTIONS:
+            self._snapshots[name] = {
+                id(record): (record, dict(record))
+                for record in user_data.get(name, []) if isinstance(record, dict)
+            }
+        self._meta = {name: dict(user_data.get(name) or {}) for name in USER_META}
+        self._user_info = dict(user_data.get("user_info") or {})
+
+    def replaced(self, name):
+        self._replaced.add(name)
+
+    def added(self, name, records):
+        self._added.setdefault(name, []).extend(records)
+
+    def updated(self, name, records):
+        updated = self._updated.setdefault(name, {})
+        for record in records:
+            updated[id(record)] = record
+
+    def removed(self, name, record_ids):
+        self._removed.setdefault(name, []).extend(record_ids)
+
+    def changes(self, user_data):
+        """Изменения в формате normalize_changes (пустой dict — ничего не менялось)"""
+        result = {}
+        for name in USER_COLLECTIONS:
+            if name in self._replaced:
+                result[name] = None
+                continue
+
+            added = self._added.get(name, [])
+            seen = {id(record) for record in added}
+            updated = []
+            for record in self._updated.get(name, {}).values():
+                if id(record) not in seen:
+                    seen.add(id(record))
+                    updated.append(record)
+
+            snapshots = self._snapshots.get(name, {})
+            for record in user_data.get(name, []):
+                snapshot = snapshots.get(id(record))
+                if snapshot and id(record) not in seen and snapshot[1] != record:
+                    seen.add(id(record))
+                    updated.append(record)
+
+            removed = self._removed.get(name, [])
+            if added or updated or removed:
+                result[name] = {"added": added, "updated": updated, "removed": removed}
+
+        for name in USER_META:
+            if name in self._replaced or (name in user_data and user_data[name] != self._meta.get(name)):
+                result[name] = None
+
+        if "user_info" in self._replaced or self._user_info != user_data.get("user_info"):
+            result["user_info"] = None
+        return result
+
+
+class TrackedList(list):
+    """Коллекция пользователя, запоминающая добавления и изменения"""
+
+    def __init__(self, iterable, tracker, name):
+        super().__init__(iterable)
+        self._tracker = tracker
+        self._name = name
+        # Индекс id -> запись (строится при первом поиске по id)
+        self._by_id = None
+
+    def _index(self, items):
+        if self._by_id is not None:
+            for item in items:
+                if isinstance(item, dict):
+                    self._by_id.setdefault(item.get("id"), item)
+
+    def get_record(self, record_id):
+        """Запись по id (None, если ее нет)"""
+        if self._by_id is None:
+            self._by_id = {}
+            self._index(self)
+        return self._by_id.get(record_id)
+
+    def delete_record(self, record_id):
+        """Удаление записи по id: в хранилище удаляется только она"""
+        record = self.get_record(record_id)
+        if record is None:
+            return None
+        list.remove(self, record)
+        del self._by_id[record_id]
+        self._tracker.removed(self._name, [record_id])
+        return record
+
+    def append(self, item):
+        super().append(item)
+        self._index([item])
+        self._tracker.added(self._name, [item])
+
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        self._index(items)
+        self._tracker.added(self._name, items)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._by_id = None
+        if isinstance(index, slice):
+            self._tracker.replaced(self._name)
+        else:
+            self._tracker.updated(self._name, [value])
+
+
+def _replacing(method_name):
+    """Операция, после которой коллекция перезаписывается целиком"""
+    method = getattr(list, method_name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._by_id = None
+        self._tracker.replaced(self._name)
+        return self if method_name == "__imul__" else result
+
+    wrapper.__name__ = method_name
+    return wrapper
+
+
+for _name in ("insert", "remove", "pop", "clear", "sort", "reverse", "__delitem__", "__imul__"):
+    setattr(TrackedList, _name, _replacing(_name))
+
+
+class TrackedUserData(dict):
+    """Данные пользователя с отслеживанием изменений (результат load_user_data в запросе)"""
+
+    def __init__(self, user_data):
+        self.tracker = ChangeTracker()
+        super().__init__(user_data)
+        for name in USER_COLLECTIONS:
+            if name in self:
+                super().__setitem__(name, TrackedList(self[name], self.tracker, name))
+        self.tracker.snapshot(self)
+
+    def __setitem__(self, key, value):
+        # user_data["goals"] = new_goals — коллекция заменена целиком
+        if key in USER_COLLECTIONS:
+            value = TrackedList(value, self.tracker, key)
+        super().__setitem__(key, value)
+        if key in USER_COLLECTIONS or key in USER_META or key == "user_info":
+            self.tracker.replaced(key)
+
+    def changes(self):
+        return self.tracker.changes(self)
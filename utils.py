@@ -1,11 +1,18 @@
 from datetime import datetime
 
+from modules.dates import ISO_FORMAT, format_iso_date, parse_day
+
 def format_currency(amount):
 
     return f"{amount:,.2f} ₽"
 
 def format_date(date_str, format_from='%Y-%m-%d', format_to='%d.%m.%Y'):
 
+    if format_from == ISO_FORMAT:
+        # Даты хранятся в ISO: быстрый путь с запоминанием
+        formatted = format_iso_date(date_str, format_to)
+        if formatted is not None:
+            return formatted
     try:
         date_obj = datetime.strptime(date_str, format_from)
         return date_obj.strftime(format_to)
@@ -54,7 +61,10 @@ def get_goal_status(goal):
         return "completed"
 
     try:
-        deadline_date = datetime.strptime(deadline, '%Y-%m-%d')
+        deadline_day = parse_day(deadline)
+        if not deadline_day:
+            return "active"
+        deadline_date = datetime.fromordinal(deadline_day)
         today = datetime.now()
         days_left = (deadline_date - today).days
 
@@ -347,12 +357,7 @@ def get_transactions_table(transactions):
         sign = "+" if amount > 0 else ""
 
         # Форматируем дату для отображения
-        date_str = t.get('date', '')
-        try:
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            display_date = date_obj.strftime('%d.%m.%Y')
-        except:
-            display_date = date_str
+        display_date = format_date(t.get('date', ''))
 
         rows += f'''
         <tr>
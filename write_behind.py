@@ -0,0 +1,254 @@
+import atexit
+import os
+import threading
+import time
+
+from modules.aggregates import update_aggregates
+from modules.storage import BaseStore, USER_COLLECTIONS, USER_META, merge_changes, normalize_changes
+from modules.tracking import SNAPSHOT_COLLECTIONS
+
+
+class WriteBehindStore(BaseStore):
+    """Отложенная запись поверх любого хранилища (групповая фиксация)
+
+    save_user_data только запоминает изменения в памяти; фоновый поток раз в окно
+    (window, секунды) пишет все накопленные изменения одной записью (save_users).
+    Пока изменения не записаны, этот процесс читает их из памяти; другие воркеры
+    увидят их после записи. Дождаться записи на диск можно через sync().
+    """
+
+    def __init__(self, store, window=0.05):
+        self.store = store
+        self.window = window
+        self._cond = threading.Condition()
+        # Ожидающие записи изменения: user_id -> (последние user_data, описание изменений)
+        self._pending = {}
+        # Изменения, которые пишутся прямо сейчас (для чтения из памяти)
+        self._writing = {}
+        # Итоги по транзакциям с учетом незаписанных изменений: user_id -> итоги
+        self._aggregates = {}
+        self._queued_at = None
+        self._urgent = False
+        # Номер последнего сохранения и последнего записанного на диск
+        self._seq = 0
+        self._durable_seq = 0
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            "saves": 0,            # вызовов save_user_data
+            "saves_written": 0,    # из них уже записано
+            "writes": 0,           # записей на диск
+            "errors": 0,
+            "latency_total": 0.0,  # от первого сохранения в окне до записи, с
+            "latency_max": 0.0,
+            "write_time_total": 0.0,
+        }
+        atexit.register(self.sync)
+
+    # ФОНОВАЯ ЗАПИСЬ
+    def _ensure_writer(self):
+        """Фоновый поток записи (заново — после fork в воркере)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._writer_loop, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Копим сохранения до конца окна (или до запроса sync)
+                deadline = self._queued_at + self.window
+                while not self._urgent and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+                queued_at, self._queued_at = self._queued_at, None
+                seq, saves = self._seq, self._stats["saves"]
+                self._urgent = False
+
+            started = time.monotonic()
+            try:
+                ok = self.store.save_users(batch)
+            except Exception as e:
+                print(f" Ошибка отложенной записи: {e}")
+                ok = False
+            finished = time.monotonic()
+
+            with self._cond:
+                self._writing = {}
+                if ok:
+                    self._durable_seq = seq
+                    for user_id in batch:
+                        if user_id not in self._pending:
+                            self._aggregates.pop(user_id, None)
+                    stats = self._stats
+                    stats["writes"] += 1
+                    stats["saves_written"] = saves
+                    stats["latency_total"] += finished - queued_at
+                    stats["latency_max"] = max(stats["latency_max"], finished - queued_at)
+                    stats["write_time_total"] += finished - started
+                else:
+                    # Возвращаем изменения в очередь (перед более новыми) и повторяем через окно
+                    self._stats["errors"] += 1
+                    for user_id, (user_data, changes) in batch.items():
+                        if user_id in self._pending:
+                            newer_data, newer_changes = self._pending[user_id]
+                            self._pending[user_id] = (newer_data, merge_changes(changes, newer_changes))
+                        else:
+                            self._pending[user_id] = (user_data, changes)
+                    self._queued_at = time.monotonic()
+                self._cond.notify_all()
+
+    def sync(self, timeout=None):
+        """Дождаться записи всех сохранений, сделанных до вызова (False — ошибка или таймаут)"""
+        with self._cond:
+            target, errors = self._seq, self._stats["errors"]
+            if self._durable_seq >= target:
+                return True
+            self._urgent = True
+            self._ensure_writer()
+            self._cond.notify_all()
+            done = self._cond.wait_for(
+                lambda: self._durable_seq >= target or self._stats["errors"] != errors, timeout
+            )
+            return done and self._durable_seq >= target
+
+    def stats(self):
+        """Статистика группировки: сколько сохранений пришлось на одну запись и задержка записи"""
+        with self._cond:
+            stats = dict(self._stats)
+            pending = len(self._pending)
+        writes = stats["writes"]
+        return {
+            "window_ms": round(self.window * 1000, 1),
+            "saves": stats["saves"],
+            "writes": writes,
+            "errors": stats["errors"],
+            "pending_users": pending,
+            "coalescing_ratio": round(stats["saves_written"] / writes, 2) if writes else None,
+            "flush_latency_avg_ms": round(stats["latency_total"] / writes * 1000, 2) if writes else None,
+            "flush_latency_max_ms": round(stats["latency_max"] * 1000, 2),
+            "write_time_avg_ms": round(stats["write_time_total"] / writes * 1000, 2) if writes else None,
+        }
+
+    # ЧТЕНИЕ С УЧЕТОМ НЕЗАПИСАННЫХ ИЗМЕНЕНИЙ
+    def _overlay(self, user_id):
+        """Последние незаписанные данные пользователя (None, если их нет)"""
+        with self._cond:
+            entry = self._pending.get(user_id) or self._writing.get(user_id)
+        return entry[0] if entry else None
+
+    def _overlay_aggregates(self, user_id, user_data, change):
+        """Итоги после незаписанного изменения транзакций — по разнице, как при записи (под self._cond)"""
+        entry = self._pending.get(user_id) or self._writing.get(user_id)
+        if entry is not None and user_id in self._aggregates:
+            # Поверх итогов предыдущих незаписанных изменений
+            stored, transactions = self._aggregates[user_id], entry[0].get("transactions", [])
+        else:
+            # Поверх итогов, с которыми данные были загружены
+            stored, transactions = user_data, None
+
+        def load_records(ids):
+            records = transactions
+            if records is None:
+                records = (self.store.load_user_data(user_id) or {}).get("transactions", [])
+            if ids is None:
+                return records
+            return [record for record in records if isinstance(record, dict) and record.get("id") in ids]
+
+        return update_aggregates(stored, user_data, change, load_records)
+
+    def _copy_user_data(self, user_id, user_data):
+        result = dict(user_data)
+        for name in USER_COLLECTIONS:
+            if name in result:
+                # Цели и инвестиции правятся на месте — копируем записи, чтобы
+                # отмененный запрос не испортил очередь
+                if name in SNAPSHOT_COLLECTIONS:
+                    result[name] = [dict(record) if isinstance(record, dict) else record
+                                    for record in result[name]]
+                else:
+                    result[name] = list(result[name])
+        for name in USER_META + ("user_info",):
+            if name in result:
+                result[name] = dict(result[name])
+        # Итоги ведет хранилище при записи — для незаписанных изменений они ведутся здесь
+        with self._cond:
+            aggregates = self._aggregates.get(user_id)
+        if aggregates is not None:
+            result.update(aggregates)
+        return result
+
+    def _overlay_user(self, user):
+        if user is None:
+            return None
+        user_data = self._overlay(user.get("id"))
+        if user_data is None:
+            return user
+        user = dict(user)
+        for name in USER_COLLECTIONS:
+            if name in user and name in user_data:
+                user[name] = list(user_data[name])
+        for name in USER_META:
+            if name in user_data:
+                user[name] = dict(user_data[name])
+        if "user_info" in user_data:
+            user["risk_profile"] = user_data["user_info"].get("risk_profile", 2)
+        return user
+
+    # ИНТЕРФЕЙС ХРАНИЛИЩА
+    def initialize(self):
+        self.store.initialize()
+
+    def invalidate(self):
+        self.store.invalidate()
+
+    def load_data(self):
+        # Полные данные читаем только после записи очереди
+        self.sync()
+        return self.store.load_data()
+
+    def save_data(self, data):
+        self.sync()
+        return self.store.save_data(data)
+
+    def get_user(self, user_id):
+        return self._overlay_user(self.store.get_user(user_id))
+
+    def find_user(self, username):
+        return self._overlay_user(self.store.find_user(username))
+
+    def create_user(self, user):
+        return self.store.create_user(user)
+
+    def load_user_data(self, user_id):
+        user_data = self._overlay(user_id)
+        if user_data is not None:
+            return self._copy_user_data(user_id, user_data)
+        return self.store.load_user_data(user_id)
+
+    def save_user_data(self, user_id, user_data, changes=None):
+        changes = normalize_changes(user_data, changes)
+        with self._cond:
+            if "transactions" in changes:
+                self._aggregates[user_id] = self._overlay_aggregates(user_id, user_data, changes["transactions"])
+            previous = self._pending.get(user_id)
+            if previous is not None:
+                changes = merge_changes(previous[1], changes)
+            self._pending[user_id] = (user_data, changes)
+            if self._queued_at is None:
+                self._queued_at = time.monotonic()
+            self._seq += 1
+            self._stats["saves"] += 1
+            self._ensure_writer()
+            self._cond.notify_all()
+        return True
+
+    def save_users(self, batch):
+        for user_id, (user_data, changes) in batch.items():
+            self.save_user_data(user_id, user_data, changes)
+        return True